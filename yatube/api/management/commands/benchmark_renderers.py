@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import (CBORRenderer, FastJSONRenderer,
+                           MessagePackRenderer, cbor2, msgpack, orjson)
+from api.serializers import PostSerializer
+from posts.models import Group, Post, User
+
+
+class Command(BaseCommand):
+    help = "Compares encode time and payload size of the API renderers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts", type=int, nargs="+", default=[1000, 10000]
+        )
+        parser.add_argument("--rounds", type=int, default=10)
+
+    def get_data(self, number):
+        author = User(id=1, username="author")
+        group = Group(id=1, title="group", slug="group")
+        now = timezone.now()
+        posts = [
+            Post(id=i, text=f"text {i} " * 20, author=author,
+                 group=group if i % 2 else None, pub_date=now)
+            for i in range(1, number + 1)
+        ]
+        return PostSerializer(posts, many=True).data
+
+    def get_renderers(self):
+        renderers = {"json": JSONRenderer()}
+        if orjson is not None:
+            renderers["orjson"] = FastJSONRenderer()
+        if msgpack is not None:
+            renderers["msgpack"] = MessagePackRenderer()
+        if cbor2 is not None:
+            renderers["cbor"] = CBORRenderer()
+        return renderers
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        renderers = self.get_renderers()
+        for number in options["posts"]:
+            data = self.get_data(number)
+            self.stdout.write(f"{number} posts:")
+            for name, renderer in renderers.items():
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    payload = renderer.render(data)
+                elapsed = (time.perf_counter() - started) / rounds * 1000
+                self.stdout.write(
+                    f"  {name}: {len(payload)} bytes, {elapsed:.2f} ms"
+                )
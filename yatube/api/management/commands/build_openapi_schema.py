@@ -0,0 +1,41 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.openapi import SCHEMA_DIR, SCHEMA_FORMATS, schema_path
+from api.schema import encode_schema, generate_schema
+
+
+class Command(BaseCommand):
+    help = "Writes the OpenAPI schema artifacts served by /api/swagger.*"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if the stored artifacts differ from the API",
+        )
+
+    def handle(self, *args, **options):
+        schema = generate_schema()
+        os.makedirs(SCHEMA_DIR, exist_ok=True)
+        stale = []
+        for schema_format in SCHEMA_FORMATS:
+            content = encode_schema(schema, schema_format)
+            path = schema_path(schema_format)
+            if options["check"]:
+                if not os.path.exists(path):
+                    stale.append(path)
+                    continue
+                with open(path, "rb") as schema_file:
+                    if schema_file.read() != content:
+                        stale.append(path)
+                continue
+            with open(path, "wb") as schema_file:
+                schema_file.write(content)
+            self.stdout.write(f"Wrote {path}")
+        if stale:
+            raise CommandError(
+                f"Stale OpenAPI schema: {', '.join(stale)}; "
+                f"run manage.py build_openapi_schema"
+            )
@@ -0,0 +1,34 @@
+"""The OpenAPI schema is built by the build_openapi_schema command
+into api/schema/ and served from there, drf_yasg is only imported
+when the artifact is missing."""
+import hashlib
+import os
+from functools import lru_cache
+
+SCHEMA_VERSION = 'v1'
+SCHEMA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'schema',
+)
+SCHEMA_MAX_AGE = 60 * 60 * 24
+SCHEMA_FORMATS = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+
+def schema_path(schema_format):
+    name = f'openapi-{SCHEMA_VERSION}.{schema_format}'
+    return os.path.join(SCHEMA_DIR, name)
+
+
+@lru_cache(maxsize=None)
+def load_schema(schema_format):
+    """Returns the encoded schema and its ETag"""
+    try:
+        with open(schema_path(schema_format), 'rb') as schema_file:
+            content = schema_file.read()
+    except FileNotFoundError:
+        from .schema import encode_schema, generate_schema
+        content = encode_schema(generate_schema(), schema_format)
+    return content, hashlib.sha256(content).hexdigest()[:32]
@@ -0,0 +1,8 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CommentCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
+    ordering = 'created'
@@ -0,0 +1,114 @@
+"""Compact wire formats for the API.
+
+MessagePack and CBOR are offered when the msgpack and cbor2 packages
+are installed, JSON is encoded with orjson when it is installed. Values
+the encoders do not know (Decimal, lazy translations, querysets...)
+are converted by DRF's JSONEncoder, so every format carries the same
+data as the plain JSON renderer.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+json_encoder = JSONEncoder()
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer on orjson; indented output for the browsable API,
+    the ASCII-only or spaced output of the UNICODE_JSON and COMPACT_JSON
+    settings and a missing orjson fall back to the standard encoder.
+
+    orjson writes datetimes itself, with ``+00:00`` instead of ``Z``,
+    and leaves U+2028 and U+2029 unescaped. Datetimes are passed
+    through to DRF's encoder and the two separators are escaped as
+    JSONRenderer does, so API payloads come out the same. orjson still
+    rejects what the standard encoder would coerce, such as non-string
+    dictionary keys; the serializers never produce those."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=json_encoder.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME,
+        ).replace(LINE_SEPARATOR, b'\\u2028').replace(
+            PARAGRAPH_SEPARATOR, b'\\u2029'
+        )
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data, default=json_encoder.default, use_bin_type=True
+        )
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as error:
+            raise ParseError(f'MessagePack parse error - {error}')
+
+
+def _cbor_default(encoder, value):
+    encoder.encode(json_encoder.default(value))
+
+
+class CBORRenderer(BaseRenderer):
+    media_type = 'application/cbor'
+    format = 'cbor'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return cbor2.dumps(data, default=_cbor_default)
+
+
+class CBORParser(BaseParser):
+    media_type = 'application/cbor'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (ValueError, cbor2.CBORDecodeError) as error:
+            raise ParseError(f'CBOR parse error - {error}')
@@ -0,0 +1,41 @@
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from .openapi import SCHEMA_VERSION
+
+
+class BothHttpAndHttpsSchemaGenerator(OpenAPISchemaGenerator):
+    def get_schema(self, request=None, public=False):
+        schema = super().get_schema(request, public)
+        schema.schemes = ["http", "https"]
+        return schema
+
+
+API_INFO = openapi.Info(
+    title="Yatut API",
+    default_version=SCHEMA_VERSION,
+    description="Документация для приложения api проекта yatut",
+    contact=openapi.Contact(email="sgamb2000@gmail.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    generator_class=BothHttpAndHttpsSchemaGenerator,
+    permission_classes=(permissions.AllowAny,),
+)
+
+
+def generate_schema():
+    generator = BothHttpAndHttpsSchemaGenerator(API_INFO)
+    return generator.get_schema(request=None, public=True)
+
+
+def encode_schema(schema, schema_format):
+    if schema_format == 'yaml':
+        return OpenAPICodecYaml(validators=[]).encode(schema)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema)
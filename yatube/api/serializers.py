@@ -1,16 +1,57 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.urls import reverse
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
-from rest_framework.validators import UniqueTogetherValidator
 
-from posts.models import Comment, Follow, Group, Post, User
+from posts.loaders import get_loaders
+from posts.models import (Comment, Follow, FollowSuggestion, Group,
+                          ModerationJob, Post, User)
+from posts.uploads import validate_image_limits
+
+
+class LoadedListSerializer(serializers.ListSerializer):
+    """Attaches the ``loaded_fields`` of the child serializer with
+    the request loaders before the items are serialized"""
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request is not None:
+            data = get_loaders(request).attach(
+                data.all() if isinstance(data, models.Manager) else data,
+                *self.child.loaded_fields,
+            )
+        return super().to_representation(data)
+
+
+class PostImageField(serializers.ImageField):
+    """Takes an upload, gives the URL of the post_image view: originals
+    are only sent through it, see posts.media. Declared fields do not
+    inherit the model validators, so the serializer passes them"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        post = value.instance
+        url = reverse('post_image', args=[post.author.username, post.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
 
 class PostSerializer(serializers.ModelSerializer):
     author = SlugRelatedField(slug_field='username', read_only=True)
+    image = PostImageField(
+        required=False,
+        allow_null=True,
+        validators=[validate_image_limits],
+    )
+    loaded_fields = ('author',)
 
     class Meta:
         fields = '__all__'
         model = Post
+        read_only_fields = ('hidden',)
+        list_serializer_class = LoadedListSerializer
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -18,12 +59,31 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only=True, slug_field='username'
     )
 
+    depth = serializers.IntegerField(read_only=True)
+
     class Meta:
         # fields = '__all__'
-        fields = ('text', 'id', 'author', 'post', 'created')
+        fields = ('text', 'id', 'author', 'post', 'parent', 'depth',
+                  'created')
         model = Comment
         read_only_fields = ('post',)
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if isinstance(self.instance, Comment):
+            # the paths of the comment and its replies follow the parent
+            # it was written under, so it can not be moved
+            fields['parent'].read_only = True
+        return fields
+
+    def validate_parent(self, value):
+        post_id = self.context['view'].kwargs.get('post_id')
+        if value is not None and value.post_id != int(post_id):
+            raise serializers.ValidationError(
+                'Ответ на комментарий к другому посту'
+            )
+        return value
+
 
 class GroupSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,25 +94,64 @@ class GroupSerializer(serializers.ModelSerializer):
 class FollowSerializer(serializers.ModelSerializer):
     user = SlugRelatedField(
         slug_field='username',
-        queryset=User.objects.all(),
+        read_only=True,
         default=serializers.CurrentUserDefault()
     )
-    following = SlugRelatedField(
-        slug_field='username',
-        queryset=User.objects.all()
-    )
+    following = serializers.CharField(source='author.username')
+    loaded_fields = ('user', 'author')
 
     class Meta:
-        fields = '__all__'
+        fields = ('id', 'user', 'following')
         model = Follow
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'following')
-            )
-        ]
+        list_serializer_class = LoadedListSerializer
 
     def validate_following(self, value):
-        if value == self.context.get('request').user:
+        if value == self.context.get('request').user.username:
             raise serializers.ValidationError('Подписка на самого себя')
         return value
+
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    author = SlugRelatedField(slug_field='username', read_only=True)
+
+    class Meta:
+        fields = ('author', 'score')
+        model = FollowSuggestion
+
+
+class ModerationJobSerializer(serializers.ModelSerializer):
+    author = SlugRelatedField(
+        slug_field='username',
+        queryset=User.objects.all(),
+        required=False,
+        allow_null=True,
+    )
+    group = SlugRelatedField(
+        slug_field='slug',
+        queryset=Group.objects.all(),
+        required=False,
+        allow_null=True,
+    )
+    target_group = SlugRelatedField(
+        slug_field='slug',
+        queryset=Group.objects.all(),
+        required=False,
+        allow_null=True,
+    )
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        fields = ('id', 'action', 'author', 'group', 'since', 'until',
+                  'target_group', 'status', 'total', 'processed',
+                  'progress', 'error', 'created', 'started', 'finished')
+        read_only_fields = ('status', 'total', 'processed', 'error',
+                            'created', 'started', 'finished')
+        model = ModerationJob
+
+    def validate(self, attrs):
+        job = ModerationJob(**attrs)
+        try:
+            job.clean()
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return attrs
@@ -0,0 +1,363 @@
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+
+import msgpack
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.renderers import FastJSONRenderer
+from posts.models import Comment, ModerationJob, Post, User
+
+
+class OpenAPISchemaTest(TestCase):
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_schema_artifact_is_fresh(self):
+        """Сохраненная схема совпадает с текущим API"""
+        try:
+            call_command("build_openapi_schema", check=True,
+                         stdout=StringIO())
+        except CommandError as error:
+            self.fail(str(error))
+
+    def test_schema_is_served_with_etag(self):
+        """Схема отдается с ETag и кешируется клиентом"""
+        response = self.guest_client.get("/api/swagger.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("max-age", response["Cache-Control"])
+        response = self.guest_client.get(
+            "/api/swagger.json",
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class ModerationAPITest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.spammer = User.objects.create(username="spammer")
+        Post.objects.create(text="spam", author=self.spammer)
+        self.client = APIClient()
+
+    def test_only_staff_can_queue_jobs(self):
+        """Задачи модерации доступны только персоналу"""
+        self.client.force_authenticate(self.spammer)
+        response = self.client.post(
+            "/api/v1/moderation/jobs/",
+            {"action": "delete", "author": "spammer"},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_job_is_queued_and_reports_progress(self):
+        """Задача ставится в очередь, прогресс виден после выполнения"""
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(
+            "/api/v1/moderation/jobs/",
+            {"action": "hide", "author": "spammer"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["status"], ModerationJob.PENDING)
+        call_command("run_moderation_jobs", stdout=StringIO())
+        response = self.client.get(
+            f"/api/v1/moderation/jobs/{response.data['id']}/"
+        )
+        self.assertEqual(response.data["status"], ModerationJob.DONE)
+        self.assertEqual(response.data["progress"], 1.0)
+        self.assertFalse(Post.objects.visible().exists())
+
+    def test_job_needs_author_or_period(self):
+        """Задача без автора и периода отклоняется"""
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(
+            "/api/v1/moderation/jobs/",
+            {"action": "delete"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SoftDeleteAPITest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username="author")
+        self.post = Post.objects.create(text="post", author=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_deleted_post_is_kept_but_not_shown(self):
+        """Удаленный пост остается в базе, но не отдается"""
+        response = self.client.delete(f"/api/v1/posts/{self.post.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.post.refresh_from_db()
+        self.assertIsNotNone(self.post.deleted)
+        response = self.client.get(f"/api/v1/posts/{self.post.pk}/")
+        self.assertEqual(response.status_code, 404)
+
+
+class PostImageAPITest(TestCase):
+    def test_image_is_the_checked_view_url(self):
+        """Картинка поста отдается ссылкой на проверяющее представление"""
+        author = User.objects.create(username="painter")
+        post = Post.objects.create(
+            text="post", author=author, image="posts/picture.gif"
+        )
+        plain = Post.objects.create(text="plain", author=author)
+        client = APIClient()
+        client.force_authenticate(author)
+        response = client.get(f"/api/v1/posts/{post.pk}/")
+        self.assertEqual(
+            response.data["image"],
+            f"http://testserver/painter/{post.pk}/image/",
+        )
+        response = client.get(f"/api/v1/posts/{plain.pk}/")
+        self.assertIsNone(response.data["image"])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10)
+    def test_image_over_the_limits_is_rejected(self):
+        """Картинка больше лимита через API не принимается"""
+        content = BytesIO()
+        Image.new("RGB", (4, 4), "red").save(content, "PNG")
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="uploader"))
+        response = client.post(
+            "/api/v1/posts/",
+            {
+                "text": "too large",
+                "image": SimpleUploadedFile(
+                    "big.png", content.getvalue(), content_type="image/png"
+                ),
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("image", response.data)
+        self.assertFalse(Post.objects.filter(text="too large").exists())
+
+
+@override_settings(RATELIMITS={**settings.RATELIMITS, "post": "1/m"})
+class ThrottleAPITest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username="writer")
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_writes_are_throttled_with_retry_after(self):
+        """Частые записи через API получают 429 и Retry-After"""
+        response = self.client.post("/api/v1/posts/", {"text": "first"})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post("/api/v1/posts/", {"text": "second"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_writes_are_not_throttled_when_disabled(self):
+        """Без RATELIMIT_ENABLED записи через API не ограничиваются"""
+        for text in ("first", "second"):
+            response = self.client.post("/api/v1/posts/", {"text": text})
+            self.assertEqual(response.status_code, 201)
+
+
+class WireFormatTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username="encoder")
+        Post.objects.bulk_create(
+            Post(text=f"пост {i}", author=self.author) for i in range(3)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_msgpack_carries_the_same_data_as_json(self):
+        """MessagePack и JSON отдают одинаковые данные"""
+        as_json = self.client.get("/api/v1/posts/")
+        as_msgpack = self.client.get(
+            "/api/v1/posts/", HTTP_ACCEPT="application/msgpack"
+        )
+        self.assertEqual(as_msgpack["Content-Type"], "application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(as_msgpack.content, raw=False),
+            json.loads(as_json.content),
+        )
+
+    def test_fast_json_matches_drf_bytes(self):
+        """orjson выдает те же байты, что и JSONRenderer DRF"""
+        data = {
+            "text": "строка\u2028абзац\u2029",
+            "pub_date": datetime(2024, 1, 2, 3, 4, 5, 123456, dt_timezone.utc),
+            "items": [1.5, None, True],
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_post_is_created_from_msgpack(self):
+        """Пост создается из тела в формате MessagePack"""
+        response = self.client.post(
+            "/api/v1/posts/",
+            msgpack.packb({"text": "из msgpack"}),
+            content_type="application/msgpack",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Post.objects.filter(text="из msgpack").exists())
+
+
+class LoaderAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/v1/posts/")
+        return len(queries)
+
+    def test_post_authors_are_loaded_at_once(self):
+        """Авторы постов загружаются одним запросом"""
+        User.objects.create(username="first_loaded")
+        Post.objects.create(
+            text="один", author=User.objects.get(username="first_loaded")
+        )
+        few = self.get_queries()
+        for i in range(5):
+            author = User.objects.create(username=f"loaded_{i}")
+            Post.objects.create(text=f"пост {i}", author=author)
+        cache.clear()
+        self.assertEqual(self.get_queries(), few)
+
+
+class FollowAPITest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="api_follower")
+        self.author = User.objects.create(username="api_author")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_follow_is_created_once(self):
+        """Подписка создается один раз, повторная отклоняется"""
+        response = self.client.post(
+            "/api/v1/follow/", {"following": "api_author"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["following"], "api_author")
+        self.assertEqual(response.data["user"], "api_follower")
+        response = self.client.post(
+            "/api/v1/follow/", {"following": "api_author"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/v1/follow/")
+        self.assertEqual(
+            [follow["following"] for follow in response.data],
+            ["api_author"],
+        )
+
+
+class CommentAPITest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username="api_commenter")
+        self.post = Post.objects.create(text="post", author=self.author)
+        self.start = timezone.now() - timedelta(hours=1)
+        self.comments = []
+        for i in range(5):
+            comment = Comment.objects.create(
+                post=self.post, author=self.author, text=f"comment {i}"
+            )
+            Comment.objects.filter(pk=comment.pk).update(
+                created=self.start + timedelta(minutes=i)
+            )
+            self.comments.append(comment.id)
+        self.url = f"/api/v1/posts/{self.post.pk}/comments/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_cursor_pages_walk_all_comments_in_order(self):
+        """Курсоры next и previous обходят комментарии по порядку"""
+        ids, url = [], f"{self.url}?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            ids.extend(comment["id"] for comment in response.data["results"])
+            last_page, url = response.data, response.data["next"]
+        self.assertEqual(ids, self.comments)
+        response = self.client.get(last_page["previous"])
+        self.assertEqual(
+            [comment["id"] for comment in response.data["results"]],
+            self.comments[2:4],
+        )
+
+    def test_since_returns_newer_comments(self):
+        """?since= отдает только более новые комментарии"""
+        since = (self.start + timedelta(minutes=2)).isoformat()
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(
+            [comment["id"] for comment in response.data["results"]],
+            self.comments[3:],
+        )
+        response = self.client.get(self.url, {"since": "вчера"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_comments_of_missing_post(self):
+        """Комментарии несуществующего или скрытого поста дают 404"""
+        response = self.client.get("/api/v1/posts/999999/comments/")
+        self.assertEqual(response.status_code, 404)
+        Post.objects.filter(pk=self.post.pk).update(hidden=True)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_replies_have_parent_and_depth(self):
+        """Ответы несут parent и depth и идут за родителем по path"""
+        response = self.client.post(
+            self.url, {"text": "reply", "parent": self.comments[0]}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["parent"], self.comments[0])
+        self.assertEqual(response.data["depth"], 1)
+        reply = response.data["id"]
+        response = self.client.post(
+            self.url, {"text": "deeper", "parent": reply}
+        )
+        self.assertEqual(response.data["depth"], 2)
+        deeper = response.data["id"]
+        response = self.client.get(self.url, {"ordering": "path"})
+        results = response.data["results"]
+        self.assertEqual(
+            [comment["id"] for comment in results[:3]],
+            [self.comments[0], reply, deeper],
+        )
+        self.assertEqual(
+            [comment["depth"] for comment in results[:4]], [0, 1, 2, 0]
+        )
+
+    def test_parent_is_checked_and_not_changed(self):
+        """Родитель должен быть из того же поста и не меняется правкой"""
+        other = Post.objects.create(text="other", author=self.author)
+        foreign = Comment.objects.create(
+            post=other, author=self.author, text="foreign"
+        )
+        response = self.client.post(
+            self.url, {"text": "reply", "parent": foreign.id}
+        )
+        self.assertEqual(response.status_code, 400)
+        comment = Comment.objects.get(pk=self.comments[1])
+        response = self.client.patch(
+            f"{self.url}{comment.id}/",
+            {"text": "edited", "parent": self.comments[0]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data["parent"])
+        saved = Comment.objects.get(pk=comment.id)
+        self.assertEqual(saved.text, "edited")
+        self.assertIsNone(saved.parent_id)
+        self.assertEqual(saved.path, comment.path)
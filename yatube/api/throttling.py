@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from yatube.ratelimit import TokenBucket, client_ident
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Writes to a view with ``throttle_scope`` share the bucket of
+    the HTML views of that scope; other requests use api_read or
+    api_write"""
+
+    def allow_request(self, request, view):
+        if not settings.RATELIMIT_ENABLED:
+            return True
+        if request.method in SAFE_METHODS:
+            scope = 'api_read'
+        else:
+            scope = getattr(view, 'throttle_scope', None) or 'api_write'
+        self.wait_seconds = TokenBucket(scope).consume(client_ident(request))
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,11 +1,9 @@
 from django.conf.urls import url
 from django.urls import include, path
-from drf_yasg import openapi
-from drf_yasg.generators import OpenAPISchemaGenerator
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions, routers
+from rest_framework import routers
 
-from .views import CommentViewSet, FollowViewSet, GroupViewSet, PostViewSet
+from .views import (CommentViewSet, FollowViewSet, GroupViewSet,
+                    ModerationJobViewSet, PostViewSet, openapi_schema)
 
 router = routers.DefaultRouter()
 
@@ -27,6 +25,10 @@ router.register(
     FollowViewSet,
     basename='followers',
 )
+router.register(
+    r'moderation/jobs',
+    ModerationJobViewSet,
+)
 
 urlpatterns = [
     path('v1/', include(router.urls)),
@@ -34,31 +36,26 @@ urlpatterns = [
 ]
 
 
-class BothHttpAndHttpsSchemaGenerator(OpenAPISchemaGenerator):
-    def get_schema(self, request=None, public=False):
-        schema = super().get_schema(request, public)
-        schema.schemes = ["http", "https"]
-        return schema
+def lazy_schema_view(renderer, cache_timeout=0):
+    """Imports drf_yasg and builds the UI view on the first request,
+    so workers that never serve the docs do not pay for it"""
+    views = {}
 
+    def view(request, *args, **kwargs):
+        if 'view' not in views:
+            from .schema import schema_view
+            views['view'] = schema_view.with_ui(
+                renderer, cache_timeout=cache_timeout
+            )
+        return views['view'](request, *args, **kwargs)
+    return view
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Yatut API",
-        default_version='v1',
-        description="Документация для приложения api проекта yatut",
-        contact=openapi.Contact(email="sgamb2000@gmail.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    generator_class=BothHttpAndHttpsSchemaGenerator,
-    permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns += [
     url(r'^swagger(?P<format>\.json|\.yaml)$',
-        schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    url(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0),
+        openapi_schema, name='schema-json'),
+    url(r'^swagger/$', lazy_schema_view('swagger'),
         name='schema-swagger-ui'),
-    url(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0),
+    url(r'^redoc/$', lazy_schema_view('redoc'),
         name='schema-redoc'),
 ]
@@ -1,41 +1,116 @@
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition, require_safe
 from rest_framework import filters, mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 
-from posts.models import Comment, Follow, Group, Post
+from posts import writes
+from posts.models import (Comment, Follow, Group, ModerationJob, Post,
+                          User)
+from posts.suggestions import SUGGESTIONS_NUMBER, get_suggestions
 
+from .openapi import SCHEMA_FORMATS, SCHEMA_MAX_AGE, load_schema
+from .pagination import CommentCursorPagination
 from .permissions import AuthorOrReadOnly
-from .serializers import (CommentSerializer, FollowSerializer, GroupSerializer,
-                          PostSerializer)
+from .serializers import (CommentSerializer, FollowSerializer,
+                          FollowSuggestionSerializer, GroupSerializer,
+                          ModerationJobSerializer, PostSerializer)
 
 
 class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all()
+    queryset = Post.objects.visible()
     serializer_class = PostSerializer
     permission_classes = (AuthorOrReadOnly,)
     pagination_class = LimitOffsetPagination
+    throttle_scope = 'post'
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        soft_delete(instance)
+
+    @action(detail=False)
+    def popular(self, request):
+        queryset = Post.objects.visible().popular()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
 
 class CommentViewSet(viewsets.ModelViewSet):
+    """Comments of a post, oldest first or in thread order with
+    ?ordering=path; ?since=<ISO 8601> returns only newer comments"""
     serializer_class = CommentSerializer
     permission_classes = (AuthorOrReadOnly,)
+    pagination_class = CommentCursorPagination
+    throttle_scope = 'comment'
+    filter_backends = (filters.OrderingFilter,)
+    ordering_fields = ('created', 'path')
+    ordering = ('created',)
 
     def get_queryset(self):
-        post_id = self.kwargs.get('post_id')
-        return Comment.objects.filter(post_id=post_id)
+        if getattr(self, 'swagger_fake_view', False):
+            return Comment.objects.none()
+        post = get_object_or_404(
+            Post.objects.visible(), pk=self.kwargs.get('post_id')
+        )
+        queryset = post.comments.visible().select_related('author')
+        since = self.request.query_params.get('since')
+        if since is not None:
+            queryset = queryset.filter(created__gt=parse_since(since))
+        return queryset
 
     def perform_create(self, serializer):
-        post_id = self.kwargs.get('post_id')
-        post = get_object_or_404(Post, pk=post_id)
-        serializer.save(author=self.request.user, post=post)
+        parent = serializer.validated_data.get('parent')
+        comment = writes.add_comment(
+            int(self.kwargs.get('post_id')),
+            self.request.user.id,
+            serializer.validated_data['text'],
+            parent_id=parent.id if parent is not None else None,
+        )
+        if comment is None:
+            raise NotFound('Пост не найден')
+        comment.author = self.request.user
+        serializer.instance = comment
+
+    def perform_destroy(self, instance):
+        soft_delete(instance)
+
+
+def soft_delete(instance):
+    """Marks the post or comment deleted; archive_posts removes it
+    after the retention period"""
+    instance.deleted = timezone.now()
+    instance.save(update_fields=['deleted'])
+
+
+def parse_since(value):
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ValidationError(
+            {'since': 'Ожидается дата и время в формате ISO 8601'}
+        )
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
 
 
 class GroupViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Group.objects.all()
+    queryset = Group.objects.by_activity()
     serializer_class = GroupSerializer
     permission_classes = (AllowAny,)
 
@@ -45,11 +120,67 @@ class FollowViewSet(mixins.CreateModelMixin,
                     viewsets.GenericViewSet):
     serializer_class = FollowSerializer
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'follow'
     filter_backends = (filters.SearchFilter,)
-    search_fields = ('following__username', 'user__username')
+    search_fields = ('author__username', 'user__username')
 
     def get_queryset(self):
         return Follow.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        username = serializer.validated_data['author']['username']
+        follow = writes.follow(self.request.user.id, username)
+        if follow is None:
+            if not User.objects.filter(username=username).exists():
+                raise ValidationError(
+                    {'following': ['Пользователь не найден']}
+                )
+            raise ValidationError(
+                {'following': ['Вы уже подписаны на этого автора']}
+            )
+        follow.user = self.request.user
+        follow.author = User(id=follow.author_id, username=username)
+        serializer.instance = follow
+
+    @action(detail=False)
+    def suggestions(self, request):
+        serializer = FollowSuggestionSerializer(
+            get_suggestions(request.user, SUGGESTIONS_NUMBER),
+            many=True,
+        )
+        return Response(serializer.data)
+
+
+class ModerationJobViewSet(mixins.CreateModelMixin,
+                           mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin,
+                           viewsets.GenericViewSet):
+    """Bulk moderation jobs for staff; a created job is queued and
+    its status and progress can be polled"""
+    queryset = ModerationJob.objects.select_related(
+        'author', 'group', 'target_group'
+    )
+    serializer_class = ModerationJobSerializer
+    permission_classes = (IsAdminUser,)
+    pagination_class = LimitOffsetPagination
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+def schema_etag(request, format):
+    return load_schema(format.lstrip('.'))[1]
+
+
+@require_safe
+@condition(etag_func=schema_etag)
+def openapi_schema(request, format):
+    """Serves the prebuilt OpenAPI schema"""
+    schema_format = format.lstrip('.')
+    content, _ = load_schema(schema_format)
+    response = HttpResponse(
+        content,
+        content_type=SCHEMA_FORMATS[schema_format],
+    )
+    patch_cache_control(response, public=True, max_age=SCHEMA_MAX_AGE)
+    return response
@@ -1,20 +1,155 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-from .models import Comment, Follow, Group, Post
+from .models import Comment, Follow, Group, ModerationJob, Post
 
+SEARCH_CONFIG = "russian"
 
-class PostAdmin(admin.ModelAdmin):
-    list_display = ("text", "pub_date", "author")
+
+class EstimatedCountPaginator(Paginator):
+    """Takes the row count of an unfiltered table from the Postgres
+    statistics instead of running COUNT(*) over millions of rows.
+
+    A partitioned table keeps no rows and no estimate of its own, so
+    the estimates of its partitions are summed; pg_partition_tree lists
+    a plain table alone."""
+    estimate_from = 100_000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor == "postgresql" and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT SUM(GREATEST(reltuples, 0)) FROM pg_class "
+                    "WHERE oid IN "
+                    "(SELECT relid FROM pg_partition_tree(%s::regclass))",
+                    [self.object_list.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] and row[0] >= self.estimate_from:
+                return int(row[0])
+        return super().count
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def queue_author_jobs(action):
+    def queue(modeladmin, request, queryset):
+        author_ids = queryset.values_list(
+            "author_id", flat=True
+        ).order_by().distinct()
+        ModerationJob.objects.bulk_create(
+            ModerationJob(
+                action=action,
+                author_id=author_id,
+                created_by=request.user,
+            )
+            for author_id in author_ids
+        )
+        modeladmin.message_user(
+            request,
+            f"Поставлено в очередь задач модерации: {len(author_ids)}",
+        )
+    queue.__name__ = f"{action}_author_content"
+    queue.allowed_permissions = ("delete",)
+    return queue
+
+
+delete_author_content = queue_author_jobs(ModerationJob.DELETE)
+delete_author_content.short_description = (
+    "Удалить все записи и комментарии авторов"
+)
+hide_author_content = queue_author_jobs(ModerationJob.HIDE)
+hide_author_content.short_description = (
+    "Скрыть все записи и комментарии авторов"
+)
+
+
+class PostAdmin(ScalableAdmin):
+    list_display = ("text", "pub_date", "author", "group", "hidden")
+    list_select_related = ("author", "group")
     search_fields = ("text",)
-    list_filter = ("pub_date",)
+    list_filter = ("pub_date", "hidden")
+    actions = (delete_author_content, hide_author_content)
+    date_hierarchy = "pub_date"
+    raw_id_fields = ("author",)
+    autocomplete_fields = ("group",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        """Uses the full text index on Postgres"""
+        vendor = connections[queryset.db].vendor
+        if not search_term or vendor != "postgresql":
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+        queryset = queryset.annotate(
+            search=SearchVector("text", config=SEARCH_CONFIG)
+        ).filter(search=SearchQuery(search_term, config=SEARCH_CONFIG))
+        return queryset, False
+
+
+class CommentAdmin(ScalableAdmin):
+    list_display = ("text", "post", "author", "created", "hidden")
+    list_select_related = ("post", "author")
+    list_filter = ("hidden",)
+    actions = (delete_author_content, hide_author_content)
+    date_hierarchy = "created"
+    raw_id_fields = ("post", "author", "parent")
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ("title", "slug", "post_count", "last_post_date")
+    search_fields = ("title", "slug")
+    ordering = ("title",)
+
+
+class FollowAdmin(ScalableAdmin):
+    list_display = ("user", "author")
+    list_select_related = ("user", "author")
+    raw_id_fields = ("user", "author")
+
+
+class ModerationJobAdmin(admin.ModelAdmin):
+    """Bulk moderation; the jobs are run by run_moderation_jobs"""
+    list_display = (
+        "__str__", "author", "group", "since", "until",
+        "status", "progress_display", "created",
+    )
+    list_select_related = ("author", "group")
+    list_filter = ("status", "action")
+    raw_id_fields = ("author",)
+    autocomplete_fields = ("group", "target_group")
+    readonly_fields = (
+        "status", "total", "processed", "error",
+        "created_by", "started", "finished",
+    )
+
+    @admin.display(description="Прогресс")
+    def progress_display(self, obj):
+        return f"{obj.processed} / {obj.total} ({obj.progress:.0%})"
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None and obj.status != ModerationJob.PENDING:
+            return [field.name for field in obj._meta.fields]
+        return self.readonly_fields
 
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ("text", "post", "author", "created")
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(ModerationJob, ModerationJobAdmin)
@@ -0,0 +1,131 @@
+"""Archive tier for old posts.
+
+Posts older than ARCHIVE_AFTER_DAYS are moved with their comments to
+ArchivedPost and ArchivedComment, so the feeds sort and filter a table
+that holds only the recent posts. Archived rows keep their ids and
+are still shown on the post page and at the end of the profile.
+
+Deleted posts and comments are kept for SOFT_DELETE_RETENTION_DAYS
+and then removed for good. Both go through moderation.delete_posts,
+which drops the feed documents and shared pages of the posts. A
+deleted comment is only removed once no reply is left under it: the
+replies of other users stay, with their paths, under the deleted one.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+from .moderation import delete_comments, delete_posts, pk_chunks
+from .stats import rebuild_group_stats
+
+BATCH_SIZE = 1000
+POST_FIELDS = (
+    "id", "text", "pub_date", "author_id", "group_id", "image",
+    "comment_count", "hidden", "deleted",
+)
+COMMENT_FIELDS = (
+    "id", "post_id", "author_id", "parent_id", "path", "text",
+    "created", "hidden", "deleted",
+)
+
+
+def _archive_batch(post_ids, groups):
+    posts = Post.objects.filter(pk__in=post_ids)
+    ArchivedPost.objects.bulk_create(
+        ArchivedPost(**row) for row in posts.values(*POST_FIELDS)
+    )
+    ArchivedComment.objects.bulk_create(
+        (ArchivedComment(**row) for row in Comment.objects.filter(
+            post_id__in=post_ids
+        ).values(*COMMENT_FIELDS).iterator()),
+        batch_size=BATCH_SIZE,
+    )
+    delete_posts(post_ids, groups)
+
+
+def archive_posts(before=None, batch_size=BATCH_SIZE):
+    """Moves the posts published before ``before`` to the archive,
+    one transaction per batch; returns the number of moved posts"""
+    if before is None:
+        before = timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    posts = Post.objects.filter(pub_date__lt=before, deleted__isnull=True)
+    groups = set()
+    archived = 0
+    for post_ids in pk_chunks(posts, batch_size):
+        with transaction.atomic():
+            _archive_batch(post_ids, groups)
+        archived += len(post_ids)
+    if groups:
+        rebuild_group_stats(groups)
+    return archived
+
+
+def purge_deleted(before=None, batch_size=BATCH_SIZE):
+    """Removes the posts and comments deleted before ``before``;
+    returns the number of removed posts and comments"""
+    if before is None:
+        before = timezone.now() - timedelta(
+            days=settings.SOFT_DELETE_RETENTION_DAYS
+        )
+    purged = 0
+    for post_ids in pk_chunks(
+        Post.objects.filter(deleted__lt=before), batch_size
+    ):
+        with transaction.atomic():
+            delete_posts(post_ids, set())
+        purged += len(post_ids)
+    # a pass removes the deleted comments without replies, so the
+    # next one finds their deleted parents without replies
+    while True:
+        removed = 0
+        for comment_ids in pk_chunks(
+            Comment.objects.filter(deleted__lt=before, replies__isnull=True),
+            batch_size,
+        ):
+            with transaction.atomic():
+                delete_comments(comment_ids, replies=False)
+            removed += len(comment_ids)
+        if not removed:
+            return purged
+        purged += removed
+
+
+class ArchiveChain:
+    """The visible recent posts followed by the archived ones, as one
+    sequence for Paginator; a page only queries the tables it covers"""
+
+    def __init__(self, posts, archived_posts):
+        self.posts = posts
+        self.archived_posts = archived_posts
+        self._count = None
+        self._posts_count = None
+
+    def posts_count(self):
+        if self._posts_count is None:
+            self._posts_count = self.posts.count()
+        return self._posts_count
+
+    def count(self):
+        if self._count is None:
+            self._count = self.posts_count() + self.archived_posts.count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(self.count())
+        split = self.posts_count()
+        items = []
+        if start < split:
+            items.extend(self.posts[start:min(stop, split)])
+        if stop > split:
+            items.extend(
+                self.archived_posts[max(start - split, 0):stop - split]
+            )
+        return items
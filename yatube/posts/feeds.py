@@ -0,0 +1,222 @@
+"""Atom, RSS and JSON Feed of the latest posts of the site, of a group
+and of an author.
+
+Each feed scope has a version in the cache, the time of its last
+change, and a cached document: the entries of its latest FEED_ITEMS
+posts with the version they were built for. A new post only bumps the
+versions of its scopes, and the next request adds the posts newer than
+the document to it with one small query; an edited or deleted post drops
+the documents of its scopes, which are then rebuilt. The version is
+also the ETag and Last-Modified of the feed, so a reader that already
+has the latest version gets a 304 without the document being read.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotFound
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.html import linebreaks
+from django.utils.http import http_date
+from django.utils.text import Truncator
+
+from .models import Post
+
+JSON_FEED_VERSION = "https://jsonfeed.org/version/1.1"
+TITLE_WORDS = 8
+
+
+class Scope:
+    """The posts of a feed and how it is called"""
+
+    def __init__(self, key, title, link, filters=None):
+        self.key = key
+        self.title = title
+        self.link = link
+        self.filters = filters or {}
+
+    @classmethod
+    def index(cls):
+        return cls("index", "Yatut", reverse("index"))
+
+    @classmethod
+    def group(cls, group):
+        return cls(
+            f"group:{group.id}",
+            f"Yatut: {group.title}",
+            reverse("group", args=[group.slug]),
+            {"group_id": group.id},
+        )
+
+    @classmethod
+    def author(cls, author):
+        return cls(
+            f"author:{author.id}",
+            f"Yatut: @{author.username}",
+            reverse("profile", args=[author.username]),
+            {"author_id": author.id},
+        )
+
+
+def post_scope_keys(post, group_id=None):
+    keys = ["index", f"author:{post.author_id}"]
+    for key in {post.group_id, group_id} - {None}:
+        keys.append(f"group:{key}")
+    return keys
+
+
+def get_cache():
+    return caches[settings.FEED_CACHE]
+
+
+def version_key(scope_key):
+    return f"feed:version:{scope_key}"
+
+
+def document_key(scope_key):
+    return f"feed:document:{scope_key}"
+
+
+def get_version(scope_key):
+    return get_cache().get_or_set(
+        version_key(scope_key), time.time_ns(), None
+    )
+
+
+def _bump(scope_keys, drop):
+    cache = get_cache()
+    cache.set_many(
+        {version_key(key): time.time_ns() for key in scope_keys}, None
+    )
+    if drop:
+        cache.delete_many([document_key(key) for key in scope_keys])
+
+
+def bump_versions(scope_keys, drop=False):
+    """Marks the feeds changed, now and once the transaction commits;
+    with ``drop`` their documents are rebuilt instead of extended"""
+    _bump(scope_keys, drop)
+    transaction.on_commit(lambda: _bump(scope_keys, drop))
+
+
+def make_entry(post):
+    return {
+        "id": post.id,
+        "title": Truncator(post.text).words(TITLE_WORDS),
+        "link": reverse("post", args=[post.author.username, post.id]),
+        "text": post.text,
+        "author": post.author.username,
+        "group": post.group.title if post.group_id else None,
+        "published": post.pub_date,
+    }
+
+
+def get_document(scope):
+    """The cached document of the scope, brought up to its version"""
+    cache = get_cache()
+    version = get_version(scope.key)
+    document = cache.get(document_key(scope.key))
+    if document is not None and document["version"] == version:
+        return document
+    posts = Post.objects.visible().filter(**scope.filters).select_related(
+        "author", "group"
+    ).order_by("-id")
+    entries = []
+    if document is not None:
+        posts = posts.filter(id__gt=document["last_id"])
+        entries = document["entries"]
+    entries = [
+        make_entry(post) for post in posts[:settings.FEED_ITEMS]
+    ] + entries
+    document = {
+        "version": version,
+        "entries": entries[:settings.FEED_ITEMS],
+        "last_id": max(
+            [entry["id"] for entry in entries]
+            + [document["last_id"] if document else 0]
+        ),
+    }
+    cache.set(
+        document_key(scope.key), document, settings.FEED_DOCUMENT_TIMEOUT
+    )
+    return document
+
+
+def render_syndication(feed_class, scope, entries, request):
+    feed = feed_class(
+        title=scope.title,
+        link=request.build_absolute_uri(scope.link),
+        description=scope.title,
+        language=settings.LANGUAGE_CODE,
+        feed_url=request.build_absolute_uri(),
+    )
+    for entry in entries:
+        link = request.build_absolute_uri(entry["link"])
+        feed.add_item(
+            title=entry["title"],
+            link=link,
+            description=linebreaks(entry["text"], autoescape=True),
+            author_name=entry["author"],
+            pubdate=entry["published"],
+            unique_id=link,
+            categories=[entry["group"]] if entry["group"] else (),
+        )
+    return feed.writeString("utf-8"), feed.content_type
+
+
+def render_json_feed(scope, entries, request):
+    feed = {
+        "version": JSON_FEED_VERSION,
+        "title": scope.title,
+        "home_page_url": request.build_absolute_uri(scope.link),
+        "feed_url": request.build_absolute_uri(),
+        "language": settings.LANGUAGE_CODE,
+        "items": [
+            {
+                "id": request.build_absolute_uri(entry["link"]),
+                "url": request.build_absolute_uri(entry["link"]),
+                "title": entry["title"],
+                "content_text": entry["text"],
+                "date_published": entry["published"].isoformat(),
+                "authors": [{"name": entry["author"]}],
+                "tags": [entry["group"]] if entry["group"] else [],
+            }
+            for entry in entries
+        ],
+    }
+    return (
+        json.dumps(feed, ensure_ascii=False),
+        "application/feed+json; charset=utf-8",
+    )
+
+
+FORMATS = {
+    "atom": lambda *args: render_syndication(Atom1Feed, *args),
+    "rss": lambda *args: render_syndication(Rss201rev2Feed, *args),
+    "json": render_json_feed,
+}
+
+
+def feed_response(request, scope, format):
+    if format not in FORMATS:
+        return HttpResponseNotFound()
+    version = get_version(scope.key)
+    etag = f'"{scope.key}:{version}:{format}"'
+    changed = version // 10 ** 9
+    response = get_conditional_response(
+        request, etag=etag, last_modified=changed
+    )
+    if response is None:
+        document = get_document(scope)
+        content, content_type = FORMATS[format](
+            scope, document["entries"], request
+        )
+        response = HttpResponse(content, content_type=content_type)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(changed)
+    patch_cache_control(response, public=True, max_age=settings.FEED_MAX_AGE)
+    return response
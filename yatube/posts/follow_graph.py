@@ -0,0 +1,124 @@
+"""Follow graph kept in memory in compressed sparse row (CSR) form.
+
+``indptr[u]:indptr[u + 1]`` is the slice of ``indices`` holding the
+authors the user ``u`` follows; the reverse arrays hold the followers
+of every author. User ids index the arrays directly, ids are stored as
+4 byte integers and offsets as 8 byte integers, so the graph takes
+``16 * (max_user_id + 2) + 8 * edges`` bytes.
+"""
+from array import array
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+
+from .models import Follow
+
+User = get_user_model()
+
+SAMPLE_SIZE = 200
+SIMILAR_USERS = 50
+COFOLLOW_WEIGHT = 0.5
+
+
+def graph_nbytes(size, edges):
+    return 2 * (size + 1) * 8 + 2 * edges * 4
+
+
+def _reverse(indptr, indices):
+    """Transposes a CSR adjacency with a counting sort"""
+    size = len(indptr) - 1
+    rev_indptr = array("q", bytes(8 * (size + 1)))
+    for target in indices:
+        rev_indptr[target + 1] += 1
+    for i in range(size):
+        rev_indptr[i + 1] += rev_indptr[i]
+    fill = array("q", rev_indptr)
+    rev_indices = array("i", bytes(4 * len(indices)))
+    for source in range(size):
+        for pos in range(indptr[source], indptr[source + 1]):
+            target = indices[pos]
+            rev_indices[fill[target]] = source
+            fill[target] += 1
+    return rev_indptr, rev_indices
+
+
+class FollowGraph:
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+        self.rev_indptr, self.rev_indices = _reverse(indptr, indices)
+
+    @classmethod
+    def from_edges(cls, edges, size):
+        """Builds the graph from ``(user_id, author_id)`` pairs sorted
+        by user_id; ``size`` is greater than any id"""
+        indptr = array("q", bytes(8 * (size + 1)))
+        indices = array("i")
+        for user_id, author_id in edges:
+            indptr[user_id + 1] += 1
+            indices.append(author_id)
+        for i in range(size):
+            indptr[i + 1] += indptr[i]
+        return cls(indptr, indices)
+
+    @classmethod
+    def from_db(cls, memory_limit=None):
+        """Loads the Follow table without materializing it in Python"""
+        if memory_limit is None:
+            memory_limit = settings.FOLLOW_GRAPH_MEMORY_LIMIT
+        size = (User.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        edges = Follow.objects.count()
+        if graph_nbytes(size, edges) > memory_limit:
+            raise MemoryError(
+                f"Follow graph of {edges} edges needs "
+                f"{graph_nbytes(size, edges)} bytes, "
+                f"the limit is {memory_limit}"
+            )
+        rows = Follow.objects.order_by("user_id", "author_id").values_list(
+            "user_id", "author_id"
+        ).iterator(chunk_size=10000)
+        return cls.from_edges(rows, size)
+
+    @property
+    def nbytes(self):
+        return sum(
+            part.itemsize * len(part)
+            for part in (self.indptr, self.indices,
+                         self.rev_indptr, self.rev_indices)
+        )
+
+    def _row(self, indptr, indices, node):
+        if node + 1 >= len(indptr):
+            return indices[0:0]
+        return indices[indptr[node]:indptr[node + 1]]
+
+    def following(self, user_id):
+        return self._row(self.indptr, self.indices, user_id)
+
+    def followers(self, author_id):
+        return self._row(self.rev_indptr, self.rev_indices, author_id)
+
+    def suggest(self, user_id, number=10):
+        """Ranks the authors the user may want to follow.
+
+        Friends of friends get a point per followed user that follows
+        them; authors followed by users with similar subscriptions get
+        COFOLLOW_WEIGHT per subscription in common.
+        """
+        followed = self.following(user_id)
+        scores = Counter()
+        similar = Counter()
+        for author_id in islice(followed, SAMPLE_SIZE):
+            scores.update(islice(self.following(author_id), SAMPLE_SIZE))
+            similar.update(islice(self.followers(author_id), SAMPLE_SIZE))
+        similar.pop(user_id, None)
+        for other_id, common in similar.most_common(SIMILAR_USERS):
+            for author_id in islice(self.following(other_id), SAMPLE_SIZE):
+                scores[author_id] += COFOLLOW_WEIGHT * common
+        scores.pop(user_id, None)
+        for author_id in followed:
+            scores.pop(author_id, None)
+        return scores.most_common(number)
@@ -1,4 +1,4 @@
-from django.forms import ModelForm
+from django.forms import HiddenInput, IntegerField, ModelForm
 
 from .models import Comment, Post
 
@@ -14,6 +14,9 @@ class PostForm(ModelForm):
 
 
 class CommentForm(ModelForm):
+    # the id is enough, posts.writes.add_comment checks the parent
+    parent = IntegerField(required=False, widget=HiddenInput)
+
     class Meta:
         model = Comment
         fields = ["text"]
@@ -0,0 +1,255 @@
+"""Shared page bodies with holes for the user specific parts.
+
+The index, group, profile and post pages look the same for everybody
+except the nav links, the edit buttons, the follow button, the comment
+form and the suggestions. Those pages are rendered once as an anonymous
+user with a marker, a hole, in place of each such fragment; the holes
+are filled for the current user when the page is sent, like ESI
+includes but done by Django so that it works behind any proxy.
+
+Anonymous visitors all get the same filled page: it is cached whole
+and marked public, nginx caches it as well. Logged in users share the
+body and only their holes are rendered, a few small templates instead
+of the page and its queries. Anonymous pages just expire.
+
+A body is cached for the versions of the scopes it shows, the way the
+feeds are: the index, a group, an author or a post, see page_scopes.
+A write bumps only the scopes it changes, a comment those of its post
+and a follow those of its two users, so the bodies of the rest of the
+site stay cached; changes to groups bump every scope.
+"""
+import hashlib
+import re
+import time
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.safestring import mark_safe
+
+from .feeds import post_scope_keys
+from .forms import CommentForm
+from .loaders import get_loaders
+from .suggestions import get_suggestions
+
+HOLES = {}
+ALL_SCOPES = "*"
+re_hole = re.compile(r"<!--hole:(\w+)\?([^>]*)-->")
+
+
+def hole(name):
+    """Registers the function rendering the fragment ``name`` for a
+    request; it gets the arguments of the marker as strings"""
+    def decorator(function):
+        HOLES[name] = function
+        return function
+    return decorator
+
+
+def hole_marker(name, params):
+    return mark_safe(f"<!--hole:{name}?{urlencode(params)}-->")
+
+
+def render_hole(name, request, params):
+    return HOLES[name](request, **params)
+
+
+def fill_holes(content, request):
+    return re_hole.sub(
+        lambda match: render_hole(
+            match[1], request, dict(parse_qsl(match[2]))
+        ),
+        content,
+    )
+
+
+@hole("nav")
+def nav_links(request):
+    return render_to_string("holes/nav.html", {"user": request.user})
+
+
+@hole("post_edit")
+def post_edit_button(request, username, post_id):
+    if request.user.username != username:
+        return ""
+    return render_to_string(
+        "holes/post_edit.html",
+        {"username": username, "post_id": post_id},
+    )
+
+
+@hole("follow_button")
+def follow_button(request, username):
+    user = request.user
+    if user.username == username:
+        return ""
+    loaders = get_loaders(request)
+    author = loaders.users_by_username.get(username)
+    following = (
+        author is not None and loaders.follows.get(user.id, author.id)
+    )
+    return render_to_string(
+        "holes/follow_button.html",
+        {"username": username, "following": following},
+    )
+
+
+@hole("comment_form")
+def comment_form(request, username, post_id):
+    if not request.user.is_authenticated:
+        return ""
+    form = CommentForm(initial={"parent": request.GET.get("reply")})
+    return render_to_string(
+        "holes/comment_form.html",
+        {"form": form, "username": username, "post_id": post_id},
+        request=request,
+    )
+
+
+@hole("reply_link")
+def reply_link(request, comment_id):
+    if not request.user.is_authenticated:
+        return ""
+    return render_to_string(
+        "holes/reply_link.html",
+        {"comment_id": comment_id},
+    )
+
+
+@hole("suggestions")
+def suggestions(request):
+    if not request.user.is_authenticated:
+        return ""
+    suggestions = get_suggestions(request.user)
+    if not suggestions:
+        return ""
+    return render_to_string(
+        "include/suggestions.html",
+        {"suggestions": suggestions},
+    )
+
+
+def get_cache():
+    return caches[settings.SHARED_PAGE_CACHE]
+
+
+def version_key(scope_key):
+    return f"shared_page:version:{scope_key}"
+
+
+def _bump(scope_keys):
+    get_cache().set_many(
+        {version_key(key): time.time_ns() for key in scope_keys}, None
+    )
+
+
+def bump_page_versions(scope_keys=(ALL_SCOPES,)):
+    """Drops the shared bodies of the scopes, now and once the
+    transaction commits; all of them by default"""
+    scope_keys = list(scope_keys)
+    _bump(scope_keys)
+    transaction.on_commit(lambda: _bump(scope_keys))
+
+
+def page_version(scope_keys):
+    keys = [version_key(key) for key in (ALL_SCOPES, *scope_keys)]
+    versions = get_cache().get_many(keys)
+    return ":".join(str(versions.get(key, 0)) for key in keys)
+
+
+def post_page_scopes(post, group_id=None):
+    """The scopes of the pages showing a post, its cards and its own
+    page; ``post`` only needs its ids"""
+    return [*post_scope_keys(post, group_id), f"post:{post.id}"]
+
+
+def index_scopes(request):
+    return ["index"]
+
+
+def group_scopes(request, slug):
+    group = get_loaders(request).groups_by_slug.get(slug)
+    return [] if group is None else [f"group:{group.id}"]
+
+
+def author_scopes(request, username, post_id=None):
+    author = get_loaders(request).users_by_username.get(username)
+    scopes = [] if author is None else [f"author:{author.id}"]
+    if post_id is not None:
+        scopes.append(f"post:{post_id}")
+    return scopes
+
+
+def render_body(view, request, args, kwargs):
+    """Renders the view as an anonymous user, with holes"""
+    user = request.user
+    request.user, request.shared_page = AnonymousUser(), True
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        request.user, request.shared_page = user, False
+
+
+def filled_response(content, content_type, request):
+    return HttpResponse(
+        fill_holes(content, request),
+        content_type=content_type,
+    )
+
+
+def shared_page(scopes=None, timeout=None):
+    """Serves the view from a shared body with holes, see above;
+    ``scopes`` gives the scope keys of a request to the view"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                not settings.SHARED_PAGES
+                or request.method not in ("GET", "HEAD")
+            ):
+                return view(request, *args, **kwargs)
+            max_age = (
+                settings.SHARED_PAGE_TIMEOUT if timeout is None else timeout
+            )
+            cache = get_cache()
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            anonymous = not request.user.is_authenticated
+            page_key = f"shared_page:anonymous:{path}"
+            if anonymous:
+                page = cache.get(page_key)
+                if page is not None:
+                    response = HttpResponse(page[0], content_type=page[1])
+                    patch_cache_control(response, public=True,
+                                        max_age=max_age)
+                    patch_vary_headers(response, ("Cookie",))
+                    return response
+            version = page_version(
+                scopes(request, *args, **kwargs) if scopes else []
+            )
+            body_key = f"shared_page:body:{version}:{path}"
+            body = cache.get(body_key)
+            if body is None:
+                response = render_body(view, request, args, kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                body = (
+                    response.content.decode(response.charset),
+                    response["Content-Type"],
+                )
+                cache.set(body_key, body, max_age)
+            response = filled_response(*body, request)
+            if anonymous:
+                cache.set(page_key, (response.content, body[1]), max_age)
+                patch_cache_control(response, public=True, max_age=max_age)
+            else:
+                patch_cache_control(response, private=True)
+            patch_vary_headers(response, ("Cookie",))
+            return response
+        return wrapper
+    return decorator
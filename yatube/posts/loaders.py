@@ -0,0 +1,153 @@
+"""Request scoped batching and memoizing loaders.
+
+Views, templates and serializers look up users, groups and follows
+one at a time. A loader queues the keys it is asked for and
+fetches all of them with a single ``IN (...)`` query when the first
+value is needed; every object is then kept until the end of the
+request, so the author of a profile, of its posts and of the follow
+button is read once.
+
+``get()`` and ``get_many()`` return the objects and ``attach()`` fills
+a foreign key of many objects at once, like ``select_related`` for
+objects that are already loaded.
+"""
+from .follows import followed_among
+from .models import Group, User
+
+
+class ModelLoader:
+    """Loads objects of a model by the value of a unique field"""
+
+    def __init__(self, queryset, field="pk"):
+        self.queryset = queryset
+        self.field = field
+        self.to_python = (
+            queryset.model._meta.pk if field == "pk"
+            else queryset.model._meta.get_field(field)
+        ).to_python
+        self.loaded = {}
+        self.queue = set()
+        self.linked = []
+
+    def want(self, keys):
+        """Queues the keys for the next query"""
+        for key in keys:
+            if key is not None:
+                key = self.to_python(key)
+                if key not in self.loaded:
+                    self.queue.add(key)
+
+    def dispatch(self):
+        keys, self.queue = self.queue, set()
+        if not keys:
+            return
+        self.loaded.update(dict.fromkeys(keys))
+        for obj in self.queryset.filter(**{f"{self.field}__in": keys}):
+            self.prime(obj)
+
+    def prime(self, obj):
+        """Remembers an object fetched by other means"""
+        for loader in (self, *self.linked):
+            loader.loaded[getattr(obj, loader.field)] = obj
+
+    def get(self, key):
+        """The object or None"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        keys = [key for key in keys if key is not None]
+        self.want(keys)
+        self.dispatch()
+        return {key: self.loaded[self.to_python(key)] for key in keys}
+
+
+class FollowLoader:
+    """Whether users follow authors, by ``(user_id, author_id)``,
+    from the follow sets of posts.follows"""
+
+    def __init__(self):
+        self.loaded = {}
+        self.queue = set()
+
+    def want(self, pairs):
+        for user_id, author_id in pairs:
+            if user_id is not None and author_id is not None:
+                key = (int(user_id), int(author_id))
+                if key not in self.loaded:
+                    self.queue.add(key)
+
+    def dispatch(self):
+        pairs, self.queue = self.queue, set()
+        authors = {}
+        for user_id, author_id in pairs:
+            authors.setdefault(user_id, set()).add(author_id)
+            self.loaded[user_id, author_id] = False
+        for user_id, author_ids in authors.items():
+            for author_id in followed_among(user_id, author_ids):
+                self.loaded[user_id, author_id] = True
+
+    def prime(self, user_id, author_id, following):
+        self.loaded[user_id, author_id] = following
+
+    def get(self, user_id, author_id):
+        if user_id is None or author_id is None:
+            return False
+        key = (int(user_id), int(author_id))
+        self.want([key])
+        self.dispatch()
+        return self.loaded[key]
+
+
+class Loaders:
+    def __init__(self):
+        self.users = ModelLoader(User.objects.all())
+        self.users_by_username = ModelLoader(User.objects.all(), "username")
+        self.users.linked.append(self.users_by_username)
+        self.users_by_username.linked.append(self.users)
+        self.groups = ModelLoader(Group.objects.all())
+        self.groups_by_slug = ModelLoader(Group.objects.all(), "slug")
+        self.groups.linked.append(self.groups_by_slug)
+        self.groups_by_slug.linked.append(self.groups)
+        self.follows = FollowLoader()
+        self.by_model = {
+            User: self.users,
+            Group: self.groups,
+        }
+
+    def attach(self, objects, *fields):
+        """Sets the foreign keys ``fields`` of the objects, querying
+        each model at most once"""
+        objects = list(objects)
+        if not objects:
+            return objects
+        meta = objects[0]._meta
+        targets = []
+        for name in fields:
+            field = meta.get_field(name)
+            loader = self.by_model[field.related_model]
+            for obj in objects:
+                if field.is_cached(obj):
+                    related = field.get_cached_value(obj)
+                    if related is not None:
+                        loader.prime(related)
+            loader.want(getattr(obj, field.attname) for obj in objects)
+            targets.append((field, loader))
+        for field, loader in targets:
+            loader.dispatch()
+            for obj in objects:
+                if not field.is_cached(obj):
+                    key = getattr(obj, field.attname)
+                    field.set_cached_value(
+                        obj, None if key is None else loader.loaded[key]
+                    )
+        return objects
+
+
+def get_loaders(request):
+    """The loaders of the request, DRF requests included"""
+    request = getattr(request, "_request", request)
+    try:
+        return request.loaders
+    except AttributeError:
+        request.loaders = Loaders()
+        return request.loaders
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.archive import BATCH_SIZE, archive_posts, purge_deleted
+
+
+class Command(BaseCommand):
+    help = ("Moves old posts to the archive and removes the deleted "
+            "ones; run it on a schedule")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ARCHIVE_AFTER_DAYS,
+            help="Archive the posts older than this number of days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Posts moved in one transaction",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        purged = purge_deleted(batch_size=options["batch_size"])
+        archived = archive_posts(
+            before=timezone.now() - timedelta(days=options["days"]),
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} posts, removed {purged} deleted posts "
+            f"and comments in {time.perf_counter() - started:.2f}s"
+        ))
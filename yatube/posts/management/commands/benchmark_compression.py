@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import PostSerializer
+from posts.models import Group, Post, User
+from posts.prepared import prepare_posts, split_columns
+from posts.views import INDEX_COLUMNS
+from yatube.compression import ENCODINGS, compress
+
+
+class Command(BaseCommand):
+    help = "Measures response size and compression time per encoding"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=500)
+        parser.add_argument("--rounds", type=int, default=20)
+
+    def get_posts(self, number):
+        author = User(id=1, username="author")
+        group = Group(id=1, title="group", slug="group")
+        now = timezone.now()
+        return [
+            Post(id=i, text=f"text {i} " * 20, author=author,
+                 group=group if i % 2 else None, pub_date=now)
+            for i in range(1, number + 1)
+        ]
+
+    def get_bodies(self, number):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        posts = self.get_posts(number)
+        page = Paginator(posts, settings.PAGE_SIZES["index"]).get_page(1)
+        html = render_to_string(
+            "index.html",
+            {
+                "page": page,
+                "columns": split_columns(
+                    prepare_posts(request, page.object_list), INDEX_COLUMNS
+                ),
+            },
+            request=request,
+        ).encode()
+        json = JSONRenderer().render(PostSerializer(posts, many=True).data)
+        return {"index.html": html, f"api {number} posts": json}
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        for name, body in self.get_bodies(options["posts"]).items():
+            self.stdout.write(f"{name}: {len(body)} bytes")
+            for encoding in ENCODINGS:
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    compressed = compress(encoding, body)
+                elapsed = (time.perf_counter() - started) / rounds * 1000
+                self.stdout.write(
+                    f"  {encoding} level "
+                    f"{settings.COMPRESSION_LEVELS[encoding]}: "
+                    f"{len(compressed)} bytes "
+                    f"({len(compressed) / len(body):.0%}), "
+                    f"{elapsed:.2f} ms"
+                )
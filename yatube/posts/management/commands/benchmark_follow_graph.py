@@ -0,0 +1,41 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.follow_graph import FollowGraph
+
+
+class Command(BaseCommand):
+    help = "Measures the follow graph build and suggestions on random edges"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--edges", type=int, default=10_000_000)
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=1000)
+
+    def edges(self, users, edges):
+        random.seed(0)
+        per_user = edges // users
+        for user_id in range(users):
+            authors = sorted(random.sample(range(users), per_user))
+            for author_id in authors:
+                yield user_id, author_id
+
+    def handle(self, *args, **options):
+        users = options["users"]
+        started = time.perf_counter()
+        graph = FollowGraph.from_edges(
+            self.edges(users, options["edges"]), users
+        )
+        built = time.perf_counter()
+        for _ in range(options["queries"]):
+            graph.suggest(random.randrange(users))
+        finished = time.perf_counter()
+        self.stdout.write(
+            f"edges: {len(graph.indices)}\n"
+            f"memory: {graph.nbytes / 2 ** 20:.1f} MiB\n"
+            f"build: {built - started:.2f}s\n"
+            f"suggest: {(finished - built) / options['queries'] * 1000:.2f}"
+            f" ms per user"
+        )
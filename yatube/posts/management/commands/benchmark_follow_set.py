@@ -0,0 +1,58 @@
+import random
+import time
+from array import array
+
+from django.core.management.base import BaseCommand
+
+from posts.follows import FollowSet, get_cache
+
+
+class Command(BaseCommand):
+    help = "Measures batch follow checks against cached follow sets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--authors", type=int, default=1000)
+        parser.add_argument("--follows", type=int, default=500)
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--rounds", type=int, default=1000)
+
+    def measure(self, name, function, rounds):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            found = function()
+        elapsed = (time.perf_counter() - started) / rounds * 1000
+        self.stdout.write(f"{name}: {elapsed:.3f} ms, {len(found)} found")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        users, rounds = options["users"], options["rounds"]
+        followed = sorted(random.sample(range(users), options["follows"]))
+        candidates = random.sample(range(users), options["authors"] // 2)
+        candidates += random.sample(followed, min(
+            options["authors"] - len(candidates), len(followed)
+        ))
+        follow_set = FollowSet(array("i", followed))
+        cache = get_cache()
+        cache.set("follows:benchmark", follow_set.to_bytes())
+        self.stdout.write(
+            f"{len(candidates)} authors against {len(follow_set)} follows, "
+            f"{len(follow_set.to_bytes())} bytes cached"
+        )
+        self.measure(
+            "binary search",
+            lambda: {a for a in candidates if a in follow_set},
+            rounds,
+        )
+        self.measure(
+            "set intersection",
+            lambda: set(candidates).intersection(follow_set.ids),
+            rounds,
+        )
+        self.measure(
+            "cache get and intersection",
+            lambda: FollowSet.from_bytes(
+                cache.get("follows:benchmark")
+            ).intersection(candidates),
+            rounds,
+        )
+        cache.delete("follows:benchmark")
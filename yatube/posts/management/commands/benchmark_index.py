@@ -0,0 +1,68 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+from posts.prepared import prepare_posts, split_columns
+from posts.views import INDEX_COLUMNS
+
+
+class Command(BaseCommand):
+    help = ("Measures preparing and rendering the index per number of "
+            "posts on the page")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts", type=int, nargs="+", default=[10, 30, 100],
+        )
+        parser.add_argument("--rounds", type=int, default=200)
+
+    def get_posts(self, number):
+        authors = [User(id=i, username=f"author{i}") for i in range(1, 6)]
+        groups = [
+            Group(id=i, title=f"group {i}", slug=f"group{i}")
+            for i in range(1, 4)
+        ]
+        now = timezone.now()
+        return [
+            Post(id=i, text=f"text {i} " * 20,
+                 author=authors[i % len(authors)],
+                 group=groups[i % len(groups)] if i % 2 else None,
+                 comment_count=i % 7, pub_date=now)
+            for i in range(1, number + 1)
+        ]
+
+    def measure(self, posts, rounds):
+        template = get_template("index.html")
+        prepared = rendered = 0.0
+        for _ in range(rounds):
+            request = RequestFactory().get("/")
+            request.user = AnonymousUser()
+            started = time.perf_counter()
+            columns = split_columns(
+                prepare_posts(request, posts), INDEX_COLUMNS
+            )
+            middle = time.perf_counter()
+            template.render({
+                "page": Paginator(posts, len(posts)).get_page(1),
+                "columns": columns,
+            }, request)
+            prepared += middle - started
+            rendered += time.perf_counter() - middle
+        return prepared / rounds * 1000, rendered / rounds * 1000
+
+    def handle(self, *args, **options):
+        for number in options["posts"]:
+            prepared, rendered = self.measure(
+                self.get_posts(number), options["rounds"]
+            )
+            self.stdout.write(
+                f"{number} posts: prepare {prepared:.2f} ms, "
+                f"render {rendered:.2f} ms, "
+                f"{(prepared + rendered) / number * 1000:.0f} us per post"
+            )
@@ -0,0 +1,106 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Post, User
+from posts.ranking import refresh_ranking
+
+SEED_BATCH = 10_000
+
+
+@contextmanager
+def given_pub_dates():
+    """bulk_create keeps the pub_date of the seeded posts"""
+    field = Post._meta.get_field("pub_date")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ("Measures refresh_ranking on seeded posts, a full run and an "
+            "incremental one; the rows are rolled back afterwards")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1_000_000)
+        parser.add_argument("--authors", type=int, default=10_000)
+        parser.add_argument("--follows", type=int, default=100_000)
+        parser.add_argument(
+            "--commented",
+            type=int,
+            default=1000,
+            help="Posts commented before the incremental run",
+        )
+
+    def seed(self, options):
+        random.seed(0)
+        now = timezone.now()
+        User.objects.bulk_create(
+            (
+                User(username=f"benchmark_ranking_{i}")
+                for i in range(options["authors"])
+            ),
+            batch_size=SEED_BATCH,
+        )
+        author_ids = list(
+            User.objects.filter(username__startswith="benchmark_ranking_")
+            .values_list("id", flat=True)
+        )
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in (
+                    random.sample(author_ids, 2)
+                    for _ in range(options["follows"])
+                )
+            ),
+            batch_size=SEED_BATCH,
+            ignore_conflicts=True,
+        )
+        with given_pub_dates():
+            for start in range(0, options["posts"], SEED_BATCH):
+                Post.objects.bulk_create([
+                    Post(
+                        text="benchmark",
+                        author_id=random.choice(author_ids),
+                        pub_date=now - timedelta(
+                            seconds=random.randrange(3 * 365 * 86400)
+                        ),
+                        comment_count=random.randrange(50),
+                    )
+                    for _ in range(min(SEED_BATCH, options["posts"] - start))
+                ])
+
+    def comment(self, number):
+        post_ids = list(
+            Post.objects.order_by("?").values_list("id", "author_id")[:number]
+        )
+        Comment.objects.bulk_create(
+            Comment(post_id=post_id, author_id=author_id, text="benchmark")
+            for post_id, author_id in post_ids
+        )
+
+    def measure(self, name, function):
+        started = time.perf_counter()
+        result = function()
+        self.stdout.write(f"{name}: {time.perf_counter() - started:.3f}s")
+        return result
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.measure("seeding", lambda: self.seed(options))
+            ranked = self.measure(
+                "full refresh", lambda: refresh_ranking(full=True)
+            )
+            self.stdout.write(f"ranked: {ranked}")
+            self.comment(options["commented"])
+            ranked = self.measure("incremental refresh", refresh_ranking)
+            self.stdout.write(f"ranked: {ranked}")
+            transaction.set_rollback(True)
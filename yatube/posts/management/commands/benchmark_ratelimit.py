@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from yatube.ratelimit import TokenBucket
+
+
+class Command(BaseCommand):
+    help = "Measures the cost of a rate limit check with the configured cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=10000)
+        parser.add_argument("--clients", type=int, default=100)
+
+    def handle(self, *args, **options):
+        bucket = TokenBucket("benchmark", rate="1000000/s")
+        rounds = options["rounds"]
+        started = time.perf_counter()
+        refused = 0
+        for i in range(rounds):
+            refused += bool(bucket.consume(f"client:{i % options['clients']}"))
+        elapsed = (time.perf_counter() - started) / rounds * 1000
+        self.stdout.write(
+            f"{elapsed:.3f} ms per check, {refused} of {rounds} refused"
+        )
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import Context, Engine, engines
+from django.test import RequestFactory
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+from posts.prepared import PreparedPost, split_columns
+
+
+class Command(BaseCommand):
+    help = "Measures index.html render time with and without cached loaders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=30)
+        parser.add_argument("--rounds", type=int, default=200)
+
+    def get_context(self, number):
+        author = User(id=1, username="author")
+        group = Group(id=1, title="group", slug="group")
+        now = timezone.now()
+        posts = [
+            Post(id=i, text=f"text {i} " * 20, author=author,
+                 group=group if i % 2 else None, pub_date=now)
+            for i in range(1, number + 1)
+        ]
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        return {
+            "page": Paginator(posts, number).get_page(1),
+            "columns": split_columns(
+                [PreparedPost(post) for post in posts], 3
+            ),
+            "request": request,
+            "user": request.user,
+        }
+
+    def measure(self, engine, context, rounds):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            engine.get_template("index.html").render(Context(context))
+        return (time.perf_counter() - started) / rounds * 1000
+
+    def handle(self, *args, **options):
+        engine_options = {
+            "dirs": settings.TEMPLATES[0]["DIRS"],
+            "libraries": engines["django"].engine.libraries,
+        }
+        uncached = Engine(
+            loaders=settings.TEMPLATE_LOADERS,
+            **engine_options,
+        )
+        cached = Engine(loaders=[(
+            "django.template.loaders.cached.Loader",
+            settings.TEMPLATE_LOADERS,
+        )], **engine_options)
+        context = self.get_context(options["posts"])
+        cached.get_template("index.html")
+        for name, engine in (("uncached", uncached), ("cached", cached)):
+            elapsed = self.measure(engine, context, options["rounds"])
+            self.stdout.write(
+                f"{name}: {elapsed:.2f} ms per render "
+                f"of {options['posts']} posts"
+            )
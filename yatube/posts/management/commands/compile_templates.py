@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube.warmup import warm_up_templates
+
+
+class Command(BaseCommand):
+    help = "Compiles every project and app template to catch errors early"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        compiled, failed = warm_up_templates()
+        for name, error in failed.items():
+            self.stderr.write(f"{name}: {error}")
+        if failed:
+            raise CommandError(f"{len(failed)} templates failed to compile")
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled {len(compiled)} templates in "
+            f"{time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.partitioning import create_partitions, is_enabled, partition_tables
+
+
+class Command(BaseCommand):
+    help = ("Creates the monthly partitions of posts and comments ahead "
+            "of time; run it monthly when POST_PARTITIONING is on")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=settings.POST_PARTITION_MONTHS_AHEAD,
+            help="Number of months ahead to cover",
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Partition the tables that are still plain first",
+        )
+
+    def handle(self, *args, **options):
+        if not is_enabled():
+            self.stdout.write(
+                "Partitioning is off: POST_PARTITIONING is not set "
+                "or the database is not Postgres"
+            )
+            return
+        if options["convert"]:
+            for table in partition_tables():
+                self.stdout.write(f"Partitioned {table}")
+        created = create_partitions(months_ahead=options["months"])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(created)} partitions created"
+        ))
@@ -0,0 +1,57 @@
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_TIME = re.compile(
+    r"import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|"
+    r"(?P<indent>\s+)(?P<module>\S+)"
+)
+
+
+class Command(BaseCommand):
+    help = ("Starts the wsgi application in a fresh interpreter and reports "
+            "the cold start time, peak RSS and the slowest imports")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--runs", type=int, default=3)
+
+    def start(self):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import yatube.wsgi"],
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+            capture_output=True,
+            text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        return elapsed, result.stderr
+
+    def handle(self, *args, **options):
+        timings = []
+        for _ in range(options["runs"]):
+            elapsed, report = self.start()
+            timings.append(elapsed)
+        rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        packages = defaultdict(int)
+        for match in IMPORT_TIME.finditer(report):
+            package = match.group("module").split(".")[0]
+            packages[package] += int(match.group("self"))
+        slowest = sorted(packages.items(), key=lambda item: -item[1])
+        self.stdout.write(
+            f"cold start: {min(timings):.2f}s best of {len(timings)}\n"
+            f"peak RSS: {rss / 1024:.1f} MiB\n"
+            f"import time by package (self, ms):"
+        )
+        for package, microseconds in slowest[:options["limit"]]:
+            self.stdout.write(f"  {package:<30} {microseconds / 1000:8.1f}")
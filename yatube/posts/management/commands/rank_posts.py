@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.ranking import refresh_ranking
+
+
+class Command(BaseCommand):
+    help = "Refreshes the popularity scores of posts; run it on a schedule"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Score every post instead of the recently changed ones",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        ranked = refresh_ranking(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {ranked} posts in "
+            f"{time.perf_counter() - started:.2f}s"
+        ))
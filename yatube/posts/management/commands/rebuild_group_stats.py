@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Group
+from posts.stats import rebuild_group_stats
+
+
+class Command(BaseCommand):
+    help = "Recounts post count, last post date and top authors of groups"
+
+    def handle(self, *args, **options):
+        rebuild_group_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistics rebuilt for {Group.objects.count()} groups"
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.moderation import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Runs the queued bulk moderation jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--wait",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting "
+                 "when the queue is empty",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds between polls with --wait",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if not options["wait"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+            started = time.perf_counter()
+            try:
+                run_job(job)
+            except Exception as error:
+                self.stderr.write(f"{job} failed: {error}")
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"{job}: {job.processed} rows in "
+                f"{time.perf_counter() - started:.2f}s"
+            ))
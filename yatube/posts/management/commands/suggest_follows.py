@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.suggestions import refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = "Recomputes the 'who to follow' suggestions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Refresh every user instead of the ones whose "
+                 "subscriptions changed",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            refreshed = refresh_suggestions(full=options["full"])
+        except MemoryError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Suggestions refreshed for {refreshed} users in "
+            f"{time.perf_counter() - started:.2f}s"
+        ))
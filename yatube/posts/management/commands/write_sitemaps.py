@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.sitemaps import write_sitemaps
+
+
+class Command(BaseCommand):
+    help = ("Writes the sitemap index and the sitemaps of posts, profiles "
+            "and groups, only the newest chunks unless --full; run it on "
+            "a schedule")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rewrite every chunk, dropping deleted and hidden posts",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        manifest = write_sitemaps(full=options["full"])
+        chunks = [
+            chunk
+            for section in manifest["sections"].values()
+            for chunk in section
+        ]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(chunks)} sitemaps with "
+            f"{sum(chunk['count'] for chunk in chunks)} URLs "
+            f"in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,26 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+
+
+def media_response(name):
+    """Sends a file from MEDIA_ROOT after the view has checked access.
+
+    In production nginx streams the file from an internal location named
+    by X-Accel-Redirect, so the worker is free as soon as the headers are
+    sent; without nginx the file is streamed by Django.
+    """
+    content_type, _ = mimetypes.guess_type(name)
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = (
+            settings.MEDIA_ACCEL_REDIRECT_URL + quote(name)
+        )
+        return response
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    if not os.path.isfile(path):
+        raise Http404("Файл не найден")
+    return FileResponse(open(path, "rb"), content_type=content_type)
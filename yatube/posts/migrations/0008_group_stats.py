@@ -0,0 +1,65 @@
+# Generated by Django 3.2.14 on 2026-10-19 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupAuthorStat = apps.get_model('posts', 'GroupAuthorStat')
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.filter(group__isnull=False).order_by()
+    totals = posts.values('group_id').annotate(
+        post_count=models.Count('id'),
+        last_post_date=models.Max('pub_date'),
+    )
+    for row in totals:
+        Group.objects.filter(pk=row['group_id']).update(
+            post_count=row['post_count'],
+            last_post_date=row['last_post_date'],
+        )
+    per_author = posts.values('group_id', 'author_id').annotate(
+        post_count=models.Count('id'),
+    )
+    GroupAuthorStat.objects.bulk_create(
+        (GroupAuthorStat(**row) for row in per_author),
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='last_post_date',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='GroupAuthorStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_stats', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_stats', to='posts.group')),
+            ],
+            options={
+                'ordering': ['-post_count'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='groupauthorstat',
+            constraint=models.UniqueConstraint(fields=('group', 'author'), name='unique_group_author_stat'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.14 on 2026-10-19 12:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_group_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRank',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='posts.post')),
+                ('score', models.FloatField(db_index=True)),
+                ('updated', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+    ]
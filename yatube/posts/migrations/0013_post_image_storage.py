@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2026-10-19 12:26
+
+from django.db import migrations, models
+import posts.uploads
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.uploads.ContentAddressedStorage(), upload_to='posts/', validators=[posts.uploads.validate_image_limits]),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def partition_tables(apps, schema_editor):
+    from posts.partitioning import partition_tables
+    partition_tables(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """Partitions posts and comments by month, without a default
+    partition, when POST_PARTITIONING is on and the database is
+    Postgres; a no-op otherwise. Turning the setting on later is done
+    with create_partitions --convert."""
+
+    dependencies = [
+        ('posts', '0016_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,55 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.db import models
 
+from .uploads import ContentAddressedStorage, validate_image_limits
+
 User = get_user_model()
 
 
+class GroupQuerySet(models.QuerySet):
+    def by_activity(self):
+        return self.order_by(
+            models.F("last_post_date").desc(nulls_last=True),
+            "-post_count",
+            "title",
+        )
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+    last_post_date = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+    )
+
+    objects = GroupQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def visible(self):
+        """Posts neither hidden by moderators nor deleted"""
+        return self.filter(hidden=False, deleted__isnull=True)
+
+    def popular(self):
+        """Posts scored by the rank_posts command, the most popular first"""
+        return self.filter(rank__isnull=False).order_by("-rank__score")
+
+
 class Post(models.Model):
     """My main model"""
     text = models.TextField()
     pub_date = models.DateTimeField(
         "date published",
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True,
     )
     author = models.ForeignKey(
         User,
@@ -33,9 +64,16 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to="posts/",
+        storage=ContentAddressedStorage(),
+        validators=[validate_image_limits],
         blank=True,
         null=True,
     )
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    hidden = models.BooleanField(default=False)
+    deleted = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
@@ -43,24 +81,350 @@ class Post(models.Model):
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def is_visible(self):
+        return not self.hidden and self.deleted is None
+
+
+class GroupAuthorStat(models.Model):
+    """Number of posts an author has in a group, kept up to date
+    by posts.signals"""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name="author_stats",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="group_stats",
+    )
+    post_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-post_count"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["group", "author"],
+                name="unique_group_author_stat",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.group}: {self.author} ({self.post_count})"
+
+
+class CommentQuerySet(models.QuerySet):
+    def visible(self):
+        return self.filter(hidden=False, deleted__isnull=True)
+
+    def in_threads(self, root_paths):
+        """Comments of the threads started by ``root_paths`` (sorted),
+        in the order of the tree"""
+        if not root_paths:
+            return self.none()
+        return self.filter(
+            path__gte=root_paths[0],
+            path__lt=root_paths[-1] + "~",
+            hidden=False,
+            deleted__isnull=True,
+        ).select_related("author").order_by("path")
+
 
 class Comment(models.Model):
+    """A comment or a reply to another comment.
+
+    ``path`` is the materialized path of zero-padded ids from the thread
+    root, so ordering by it gives the whole tree in one query.
+    """
+    PATH_STEP = 10
+    MAX_DEPTH = 20
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
                              related_name="comments")
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name="comments")
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="replies",
+    )
+    path = models.CharField(max_length=255, editable=False, default="")
     text = models.TextField()
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    hidden = models.BooleanField(default=False)
+    deleted = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "path"]),
+        ]
+
+    def __str__(self):
+        return self.text[:15]
+
+    @property
+    def depth(self):
+        return len(self.path) // (self.PATH_STEP + 1) - 1
+
+    @property
+    def is_visible(self):
+        return not self.hidden and self.deleted is None
+
+    def save(self, *args, **kwargs):
+        if self.parent is not None and self.parent.depth >= self.MAX_DEPTH:
+            self.parent = self.parent.parent
+        super().save(*args, **kwargs)
+        if not self.path:
+            prefix = self.parent.path if self.parent is not None else ""
+            self.path = f"{prefix}{self.pk:0{self.PATH_STEP}d}/"
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
+
+class ArchivedPost(models.Model):
+    """A post moved out of the Post table by archive_posts; it keeps
+    its id, so its URL does not change"""
+    archived = True
+
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField()
+    pub_date = models.DateTimeField("date published", db_index=True)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_posts",
+    )
+    group = models.ForeignKey(
+        Group, on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="archived_posts",
+    )
+    image = models.ImageField(
+        upload_to="posts/",
+        storage=ContentAddressedStorage(),
+        blank=True,
+        null=True,
+    )
+    comment_count = models.PositiveIntegerField(default=0)
+    hidden = models.BooleanField(default=False)
+    deleted = models.DateTimeField(blank=True, null=True)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-pub_date"]
 
     def __str__(self):
         return self.text[:15]
 
 
+class ArchivedComment(models.Model):
+    """A comment of an archived post"""
+    PATH_STEP = Comment.PATH_STEP
+
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name="comments",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_comments",
+    )
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="replies",
+    )
+    path = models.CharField(max_length=255, default="")
+    text = models.TextField()
+    created = models.DateTimeField()
+    hidden = models.BooleanField(default=False)
+    deleted = models.DateTimeField(blank=True, null=True)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "path"]),
+        ]
+
+    def __str__(self):
+        return self.text[:15]
+
+    depth = Comment.depth
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="follower")
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="following")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"],
+                name="unique_follow",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user}->{self.author}"
+
+
+class PostRank(models.Model):
+    """Popularity score of a post, refreshed by the rank_posts command"""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rank",
+    )
+    score = models.FloatField(db_index=True)
+    updated = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["-score"]
+
+    def __str__(self):
+        return f"{self.post_id}: {self.score:.3f}"
+
+
+class FollowSuggestion(models.Model):
+    """An author recommended to the user, filled by suggest_follows"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="follow_suggestions",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="suggested_to",
+    )
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["-score"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"],
+                name="unique_follow_suggestion",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user}->{self.author} ({self.score:.1f})"
+
+
+class StaleFollowSuggestions(models.Model):
+    """A user whose subscriptions changed after the last suggest_follows"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="+",
+    )
+
+
+class ModerationJob(models.Model):
+    """A bulk moderation operation over the posts and comments of an
+    author or a period, run in chunks by run_moderation_jobs"""
+    DELETE = "delete"
+    HIDE = "hide"
+    SHOW = "show"
+    MOVE = "move"
+    ACTIONS = [
+        (DELETE, "Удалить"),
+        (HIDE, "Скрыть"),
+        (SHOW, "Показать"),
+        (MOVE, "Перенести в группу"),
+    ]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Готово"),
+        (FAILED, "Ошибка"),
+    ]
+
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+        help_text="Только записи этой группы",
+    )
+    since = models.DateTimeField(blank=True, null=True)
+    until = models.DateTimeField(blank=True, null=True)
+    target_group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+        help_text="Новая группа записей, пусто - без группы",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        editable=False,
+        db_index=True,
+    )
+    total = models.PositiveIntegerField(default=0, editable=False)
+    processed = models.PositiveIntegerField(default=0, editable=False)
+    error = models.TextField(blank=True, editable=False)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        editable=False,
+        related_name="+",
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, editable=False)
+    finished = models.DateTimeField(null=True, editable=False)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def __str__(self):
+        return f"{self.get_action_display()} #{self.pk}"
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 1.0 if self.status == self.DONE else 0.0
+        return min(self.processed / self.total, 1.0)
+
+    def clean(self):
+        if self.author_id is None and not (self.since or self.until):
+            raise ValidationError(
+                "Укажите автора или период, чтобы не задеть все записи"
+            )
+        if self.since and self.until and self.since > self.until:
+            raise ValidationError("Начало периода позже его конца")
@@ -0,0 +1,296 @@
+"""Bulk moderation of posts and comments.
+
+A ModerationJob selects the posts and comments of an author and/or
+a period and deletes, hides, shows or moves them. The rows are walked
+by primary key CHUNK_SIZE at a time, every chunk is a few set-based
+statements in its own transaction, so a large purge never holds locks
+for long. The per-object signals are bypassed: comment counters and
+group statistics of the touched rows are recounted once per chunk and
+once per job, and the feeds and shared pages of the touched posts are
+dropped once per chunk.
+
+Archived posts and comments are still shown on the profile and the post
+page, so every job runs over the archive tables as well, after the
+recent rows.
+"""
+import traceback
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .feeds import bump_versions, post_scope_keys
+from .holes import bump_page_versions, post_page_scopes
+from .models import (ArchivedComment, ArchivedPost, Comment, ModerationJob,
+                     Post, PostRank)
+from .stats import rebuild_group_stats
+
+CHUNK_SIZE = 1000
+
+
+def job_posts(job, model=Post):
+    posts = model.objects.all()
+    if job.author_id is not None:
+        posts = posts.filter(author_id=job.author_id)
+    if job.group_id is not None:
+        posts = posts.filter(group_id=job.group_id)
+    if job.since is not None:
+        posts = posts.filter(pub_date__gte=job.since)
+    if job.until is not None:
+        posts = posts.filter(pub_date__lt=job.until)
+    if job.action == ModerationJob.HIDE:
+        posts = posts.filter(hidden=False)
+    elif job.action == ModerationJob.SHOW:
+        posts = posts.filter(hidden=True)
+    elif job.action == ModerationJob.MOVE:
+        posts = posts.exclude(group_id=job.target_group_id)
+    return posts
+
+
+def job_comments(job, model=Comment):
+    comments = model.objects.all()
+    if job.author_id is not None:
+        comments = comments.filter(author_id=job.author_id)
+    if job.group_id is not None:
+        comments = comments.filter(post__group_id=job.group_id)
+    if job.since is not None:
+        comments = comments.filter(created__gte=job.since)
+    if job.until is not None:
+        comments = comments.filter(created__lt=job.until)
+    if job.action == ModerationJob.HIDE:
+        comments = comments.filter(hidden=False)
+    elif job.action == ModerationJob.SHOW:
+        comments = comments.filter(hidden=True)
+    return comments
+
+
+def pk_chunks(queryset, size=CHUNK_SIZE):
+    """Yields lists of primary keys, ``size`` at a time"""
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_id).order_by("pk").values_list(
+                "pk", flat=True
+            )[:size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def comment_model(model):
+    """Comment or ArchivedComment, for Post or ArchivedPost"""
+    return model._meta.get_field("comments").related_model
+
+
+def post_model(model):
+    """Post or ArchivedPost, for Comment or ArchivedComment"""
+    return model._meta.get_field("post").related_model
+
+
+def recount_comments(post_ids, model=Post):
+    """Sets comment_count of the posts to their number of visible
+    comments with a single UPDATE"""
+    visible = comment_model(model).objects.visible().filter(
+        post_id=OuterRef("pk"),
+    ).values("post_id").annotate(number=Count("pk")).values("number")
+    model.objects.filter(pk__in=post_ids).update(
+        comment_count=Coalesce(Subquery(visible), Value(0))
+    )
+
+
+def drop_post_caches(post_ids, group_id=None, feeds=True, model=Post):
+    """Drops the feed documents and shared pages showing the posts,
+    read before they change; ``group_id`` is a group they move to.
+    Comments and archived posts only change the pages, so they pass
+    ``feeds=False``"""
+    feed_keys, page_keys = set(), set()
+    for post_id, author_id, post_group_id in model.objects.filter(
+        pk__in=post_ids,
+    ).values_list("id", "author_id", "group_id"):
+        post = Post(id=post_id, author_id=author_id, group_id=post_group_id)
+        feed_keys.update(post_scope_keys(post, group_id))
+        page_keys.update(post_page_scopes(post, group_id))
+    if feeds and feed_keys:
+        bump_versions(feed_keys, drop=True)
+    if page_keys:
+        bump_page_versions(page_keys)
+
+
+def _comment_subtrees(comment_ids, model=Comment):
+    """Adds the replies to the comments, one query per level"""
+    found = set(comment_ids)
+    level = list(comment_ids)
+    while level:
+        level = list(model.objects.filter(
+            parent_id__in=level
+        ).exclude(pk__in=found).values_list("pk", flat=True))
+        found.update(level)
+    return found
+
+
+def _touched_groups(posts, groups):
+    """Adds the groups of the posts to ``groups``; the statistics only
+    count recent posts, so archived ones touch no group"""
+    if posts.model is Post:
+        groups.update(posts.filter(group__isnull=False).values_list(
+            "group_id", flat=True
+        ).distinct())
+
+
+def delete_posts(post_ids, groups, model=Post):
+    """Deletes the posts with their comments and ranks; adds the groups
+    whose statistics must be rebuilt to ``groups``"""
+    posts = model.objects.filter(pk__in=post_ids)
+    _touched_groups(posts.visible(), groups)
+    drop_post_caches(post_ids, feeds=model is Post, model=model)
+    comment_model(model).objects.filter(
+        post_id__in=post_ids
+    )._raw_delete(posts.db)
+    if model is Post:
+        PostRank.objects.filter(post_id__in=post_ids)._raw_delete(posts.db)
+    posts._raw_delete(posts.db)
+
+
+def delete_comments(comment_ids, groups=None, replies=True, model=Comment):
+    """Deletes the comments, with the replies to them unless
+    ``replies`` is false"""
+    if replies:
+        comment_ids = _comment_subtrees(comment_ids, model)
+    comments = model.objects.filter(pk__in=comment_ids)
+    post_ids = set(comments.values_list("post_id", flat=True))
+    comments._raw_delete(comments.db)
+    recount_comments(post_ids, post_model(model))
+    drop_post_caches(post_ids, feeds=False, model=post_model(model))
+
+
+def _set_posts_hidden(hidden, model=Post):
+    def apply(post_ids, groups):
+        posts = model.objects.filter(pk__in=post_ids)
+        _touched_groups(posts, groups)
+        drop_post_caches(post_ids, feeds=model is Post, model=model)
+        posts.update(hidden=hidden)
+    return apply
+
+
+def _set_comments_hidden(hidden, model=Comment):
+    def apply(comment_ids, groups):
+        comments = model.objects.filter(pk__in=comment_ids)
+        post_ids = set(comments.values_list("post_id", flat=True))
+        comments.update(hidden=hidden)
+        recount_comments(post_ids, post_model(model))
+        drop_post_caches(post_ids, feeds=False, model=post_model(model))
+    return apply
+
+
+def _move_posts(target_group_id, model=Post):
+    def apply(post_ids, groups):
+        posts = model.objects.filter(pk__in=post_ids)
+        _touched_groups(posts, groups)
+        drop_post_caches(
+            post_ids, target_group_id, feeds=model is Post, model=model
+        )
+        posts.update(group_id=target_group_id)
+    return apply
+
+
+def job_steps(job):
+    """``(queryset, apply)`` pairs run one after another; ``apply``
+    takes a chunk of ids and the set of touched group ids"""
+    if job.action == ModerationJob.DELETE:
+        return [
+            (job_posts(job), delete_posts),
+            (
+                job_posts(job, ArchivedPost),
+                partial(delete_posts, model=ArchivedPost),
+            ),
+            (job_comments(job), delete_comments),
+            (
+                job_comments(job, ArchivedComment),
+                partial(delete_comments, model=ArchivedComment),
+            ),
+        ]
+    if job.action in (ModerationJob.HIDE, ModerationJob.SHOW):
+        hidden = job.action == ModerationJob.HIDE
+        return [
+            (job_posts(job), _set_posts_hidden(hidden)),
+            (
+                job_posts(job, ArchivedPost),
+                _set_posts_hidden(hidden, ArchivedPost),
+            ),
+            (job_comments(job), _set_comments_hidden(hidden)),
+            (
+                job_comments(job, ArchivedComment),
+                _set_comments_hidden(hidden, ArchivedComment),
+            ),
+        ]
+    if job.action == ModerationJob.MOVE:
+        return [
+            (job_posts(job), _move_posts(job.target_group_id)),
+            (
+                job_posts(job, ArchivedPost),
+                _move_posts(job.target_group_id, ArchivedPost),
+            ),
+        ]
+    raise ValueError(f"Unknown moderation action {job.action!r}")
+
+
+def _set_status(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    ModerationJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_job(job):
+    """Runs the job to the end, saving the progress after every chunk"""
+    steps = job_steps(job)
+    _set_status(
+        job,
+        status=ModerationJob.RUNNING,
+        started=timezone.now(),
+        processed=0,
+        total=sum(queryset.count() for queryset, _ in steps),
+    )
+    groups = set()
+    if job.action == ModerationJob.MOVE and job.target_group_id:
+        groups.add(job.target_group_id)
+    try:
+        for queryset, apply in steps:
+            for ids in pk_chunks(queryset):
+                with transaction.atomic():
+                    apply(ids, groups)
+                ModerationJob.objects.filter(pk=job.pk).update(
+                    processed=F("processed") + len(ids)
+                )
+                job.processed += len(ids)
+        if groups:
+            rebuild_group_stats(groups)
+    except Exception:
+        _set_status(
+            job,
+            status=ModerationJob.FAILED,
+            error=traceback.format_exc(),
+            finished=timezone.now(),
+        )
+        raise
+    _set_status(job, status=ModerationJob.DONE, finished=timezone.now())
+    return job
+
+
+def claim_job():
+    """Marks the oldest pending job as running and returns it, or None;
+    workers running side by side never get the same job"""
+    with transaction.atomic():
+        job = ModerationJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(status=ModerationJob.PENDING).order_by("created").first()
+        if job is not None:
+            _set_status(
+                job,
+                status=ModerationJob.RUNNING,
+                started=timezone.now(),
+            )
+    return job
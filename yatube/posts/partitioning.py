@@ -0,0 +1,205 @@
+"""Monthly range partitioning of posts and comments on Postgres.
+
+With POST_PARTITIONING the posts_post table is partitioned by pub_date
+and posts_comment by created, one partition per month. Queries bounded
+by date only touch the matching months, and ``ORDER BY pub_date DESC
+LIMIT n`` is an ordered append that reads the newest partitions first
+and stops early.
+
+There is no default partition on purpose: while one exists Postgres
+can not append the partitions in order and merges all of them for
+every feed page instead. A row outside the monthly partitions is
+refused, so create_partitions has to run monthly to keep partitions
+ahead of the current month; default partitions created by earlier
+versions are emptied into monthly ones and dropped by it.
+
+The primary key of a partitioned table has to include the partition
+key, so the foreign keys pointing at posts and comments cannot be kept
+in the database; the ORM still cascades the deletes. Other backends
+keep plain tables and every function here does nothing.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+from django.utils import timezone
+
+PARTITIONED_TABLES = {
+    "posts_post": "pub_date",
+    "posts_comment": "created",
+}
+
+
+def is_enabled(connection=default_connection):
+    return (
+        settings.POST_PARTITIONING
+        and connection.vendor == "postgresql"
+    )
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def month_start(moment):
+    return date(moment.year, moment.month, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def months_between(first, last):
+    """First days of the months from ``first`` to ``last`` inclusive"""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass(%s)",
+        [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def existing_partitions(cursor, table):
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(%s)",
+        [table],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_partition(cursor, table, column, month):
+    """Adds the partition of the month"""
+    name = partition_name(table, month)
+    cursor.execute(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM (%s) TO (%s)",
+        [month, add_months(month, 1)],
+    )
+    return name
+
+
+def drop_default_partition(cursor, table, column):
+    """Moves the rows of the default partition of the table to monthly
+    partitions and drops it; returns whether there was one"""
+    default = f"{table}_default"
+    if default not in existing_partitions(cursor, table):
+        return False
+    cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+    cursor.execute(f"SELECT min({column}), max({column}) FROM {default}")
+    first, last = cursor.fetchone()
+    if first is not None:
+        existing = existing_partitions(cursor, table)
+        for month in months_between(first, last.date()):
+            if partition_name(table, month) not in existing:
+                create_partition(cursor, table, column, month)
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {default}")
+    cursor.execute(f"DROP TABLE {default}")
+    return True
+
+
+def create_partitions(months_ahead=None, since=None,
+                      connection=default_connection):
+    """Makes sure every month from ``since`` (this month by default)
+    to ``months_ahead`` months from now has a partition; returns the
+    names of the created partitions"""
+    if not is_enabled(connection):
+        return []
+    if months_ahead is None:
+        months_ahead = settings.POST_PARTITION_MONTHS_AHEAD
+    today = timezone.now().date()
+    last = add_months(today, months_ahead)
+    created = []
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            for table, column in PARTITIONED_TABLES.items():
+                if not is_partitioned(cursor, table):
+                    continue
+                drop_default_partition(cursor, table, column)
+                existing = existing_partitions(cursor, table)
+                created.extend(
+                    create_partition(cursor, table, column, month)
+                    for month in months_between(since or today, last)
+                    if partition_name(table, month) not in existing
+                )
+    return created
+
+
+def _index_definitions(cursor, table):
+    """CREATE INDEX statements of the table, without the primary key"""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'p')",
+        [table, table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _foreign_keys(cursor, table):
+    """Foreign keys of the table that can be kept once it is
+    partitioned: the ones that do not point at a partitioned table"""
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f' "
+        "AND confrelid::regclass::text <> ALL(%s)",
+        [table, list(PARTITIONED_TABLES)],
+    )
+    return cursor.fetchall()
+
+
+def partition_table(cursor, table, column):
+    """Turns a plain table into a partitioned one in place"""
+    old = f"{table}_unpartitioned"
+    indexes = _index_definitions(cursor, table)
+    foreign_keys = _foreign_keys(cursor, table)
+    cursor.execute(f"SELECT min({column}), max({column}) FROM {table}")
+    first, newest = cursor.fetchone()
+    first = first or timezone.now()
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    cursor.execute(
+        f"CREATE TABLE {table} "
+        f"(LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({column})"
+    )
+    cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {column})")
+    cursor.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    last = add_months(
+        timezone.now().date(),
+        settings.POST_PARTITION_MONTHS_AHEAD,
+    )
+    if newest is not None:
+        last = max(last, newest.date())
+    for month in months_between(first, last):
+        create_partition(cursor, table, column, month)
+    cursor.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    cursor.execute(f"DROP TABLE {old} CASCADE")
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"
+        )
+
+
+def partition_tables(connection=default_connection):
+    """Partitions the tables that are still plain; returns their names"""
+    if not is_enabled(connection):
+        return []
+    converted = []
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            for table, column in PARTITIONED_TABLES.items():
+                if not is_partitioned(cursor, table):
+                    partition_table(cursor, table, column)
+                    converted.append(table)
+    return converted
@@ -0,0 +1,63 @@
+"""Posts of a page prepared for the cards of include/post_item.html.
+
+The index shows the most cards of all pages. Its posts are read once,
+their authors and groups attached by the loaders, and each card is
+reduced to the values the template shows, with the URL of its thumbnail
+resolved here instead of by a ``{% thumbnail %}`` tag per card. The
+columns of the index are slices of that list, so the template only
+loops over them.
+"""
+import logging
+from math import ceil
+
+from sorl.thumbnail import get_thumbnail
+
+from .loaders import get_loaders
+
+THUMBNAIL_GEOMETRY = "960x339"
+THUMBNAIL_OPTIONS = {"crop": "center", "upscale": True}
+
+logger = logging.getLogger(__name__)
+
+
+class PreparedPost:
+    """What a card shows of a post"""
+    __slots__ = (
+        "id", "text", "author", "group", "image_url", "comment_count",
+        "pub_date",
+    )
+    archived = False
+
+    def __init__(self, post):
+        self.id = post.id
+        self.text = post.text
+        self.author = post.author
+        self.group = post.group
+        self.image_url = thumbnail_url(post.image)
+        self.comment_count = post.comment_count
+        self.pub_date = post.pub_date
+
+
+def thumbnail_url(image):
+    """The URL of the card thumbnail, None when there is no image or
+    it can not be read, as the template tag does"""
+    if not image:
+        return None
+    try:
+        return get_thumbnail(
+            image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+        ).url
+    except Exception:
+        logger.exception("Thumbnail of %s failed", image)
+        return None
+
+
+def prepare_posts(request, posts):
+    posts = get_loaders(request).attach(posts, "author", "group")
+    return [PreparedPost(post) for post in posts]
+
+
+def split_columns(items, count):
+    """The items in ``count`` columns, filled one after the other"""
+    size = max(ceil(len(items) / count), 1)
+    return [items[i * size:(i + 1) * size] for i in range(count)]
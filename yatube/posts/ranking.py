@@ -0,0 +1,107 @@
+"""Popularity ranking of posts.
+
+The score grows with the logarithm of engagement (comments and the
+follower reach of the author) and linearly with the publication time,
+so every ``DECAY_SECONDS`` of age cost a post as much as a tenfold
+engagement. Old scores never have to be recomputed just because time
+passes: only posts that got new comments since the previous run are
+refreshed.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, PostRank
+
+EPOCH = datetime(2021, 1, 1, tzinfo=dt_timezone.utc)
+DECAY_SECONDS = 45000
+COMMENT_WEIGHT = 1.0
+REACH_WEIGHT = 0.1
+CHUNK_SIZE = 1000
+
+
+def post_score(pub_date, comment_count, follower_count):
+    engagement = (
+        1
+        + COMMENT_WEIGHT * comment_count
+        + REACH_WEIGHT * follower_count
+    )
+    age = (pub_date - EPOCH).total_seconds()
+    return math.log10(engagement) + age / DECAY_SECONDS
+
+
+def score_posts(rows, comment_counts, follower_counts):
+    """Scores ``(post_id, author_id, pub_date)`` rows.
+
+    Yields ``(post_id, score)`` pairs.
+    """
+    for post_id, author_id, pub_date in rows:
+        yield post_id, post_score(
+            pub_date,
+            comment_counts.get(post_id, 0),
+            follower_counts.get(author_id, 0),
+        )
+
+
+def _count_by(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(number=Count("pk")).order_by()
+    )
+
+
+def _save_chunk(rows, now):
+    post_ids = [row[0] for row in rows]
+    author_ids = {row[1] for row in rows}
+    comment_counts = {row[0]: row[3] for row in rows}
+    follower_counts = _count_by(
+        Follow.objects.filter(author_id__in=author_ids), "author_id"
+    )
+    ranks = [
+        PostRank(post_id=post_id, score=score, updated=now)
+        for post_id, score in score_posts(
+            [row[:3] for row in rows], comment_counts, follower_counts
+        )
+    ]
+    with transaction.atomic():
+        PostRank.objects.filter(post_id__in=post_ids).delete()
+        PostRank.objects.bulk_create(ranks)
+    return len(ranks)
+
+
+def _chunks(queryset):
+    """Walks the posts by primary key, CHUNK_SIZE rows at a time"""
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_id).order_by("pk").values_list(
+                "pk", "author_id", "pub_date", "comment_count"
+            )[:CHUNK_SIZE]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def refresh_ranking(full=False):
+    """Updates the stored scores and returns the number of ranked posts.
+
+    Without ``full`` only the posts published or commented since
+    the previous run are scored again.
+    """
+    now = timezone.now()
+    since = None
+    if not full:
+        since = PostRank.objects.aggregate(last=Max("updated"))["last"]
+    posts = Post.objects.all()
+    if since is not None:
+        commented = Comment.objects.filter(
+            created__gte=since
+        ).values("post_id")
+        posts = posts.filter(pk__in=commented) | posts.filter(
+            pub_date__gte=since
+        )
+    return sum(_save_chunk(rows, now) for rows in _chunks(posts))
@@ -0,0 +1,85 @@
+"""Infinite scroll: the cards of the posts after a cursor.
+
+Following a "next page" link renders base.html, the nav, the sidebar
+and the footer again for a few new cards. Each list of posts also has a
+fragment view returning only the include/post_item.html cards of the
+next posts and a marker with the URL of the fragment after them; the
+script of base.html loads it when the marker scrolls into view and puts
+the cards in its place. Without the script the paginator still works.
+
+The position is a cursor, the sort key and the id of the last post
+shown, so a fragment is a ``WHERE (key, id) < cursor`` query that costs
+the same however far the reader has scrolled, unlike a page OFFSET.
+"""
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import Http404
+from django.utils.http import urlencode
+
+SEPARATOR = "_"
+
+
+def sort_key(post, field):
+    """The value of ``field``, which may span relations, for a post"""
+    value = post
+    for name in field.split("__"):
+        value = getattr(value, name)
+    return value
+
+
+def make_cursor(post, field):
+    key = sort_key(post, field)
+    if hasattr(key, "isoformat"):
+        key = key.isoformat()
+    return f"{key}{SEPARATOR}{post.id}"
+
+
+def get_field(model, field):
+    *relations, name = field.split("__")
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def after_cursor(queryset, field, cursor):
+    """The posts of the queryset after the cursor, in the order of
+    ``field`` and then the id, both descending"""
+    queryset = queryset.order_by(f"-{field}", "-id")
+    if not cursor:
+        return queryset
+    try:
+        key, post_id = cursor.rsplit(SEPARATOR, 1)
+        key = get_field(queryset.model, field).to_python(key)
+        post_id = int(post_id)
+    except (ValueError, ValidationError, FieldDoesNotExist):
+        raise Http404("Неверный курсор")
+    return queryset.filter(
+        Q(**{f"{field}__lt": key}) | Q(**{field: key, "id__lt": post_id})
+    )
+
+
+def next_posts(querysets, field, cursor, size):
+    """The ``size`` posts after the cursor from the querysets, read one
+    after the other, as ArchiveChain does, and the cursor after them or
+    None at the end"""
+    posts = []
+    for queryset in querysets:
+        posts.extend(
+            after_cursor(queryset, field, cursor)[:size + 1 - len(posts)]
+        )
+        if len(posts) > size:
+            return posts[:size], make_cursor(posts[size - 1], field)
+    return posts, None
+
+
+def scroll_url(path, cursor):
+    if cursor is None:
+        return None
+    return f"{path}?{urlencode({'after': cursor})}"
+
+
+def page_scroll_url(page, path, field="pub_date"):
+    """The URL of the fragment following a page"""
+    if not page.has_next():
+        return None
+    return scroll_url(path, make_cursor(page[-1], field))
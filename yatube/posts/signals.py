@@ -0,0 +1,137 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .feeds import bump_versions, post_scope_keys
+from .follows import forget_follow_set
+from .holes import bump_page_versions, post_page_scopes
+from .models import Comment, Follow, Group, Post
+from .stats import add_post_to_group, remove_post_from_group
+from .suggestions import mark_stale
+
+
+def counted_group_id(post):
+    """The group a post is counted in; hidden and deleted posts
+    are not counted"""
+    return post.group_id if post.is_visible else None
+
+
+def remember_group(post):
+    """Saves the query of remember_post_group for a post that has just
+    been loaded and is about to be changed"""
+    post._old_group_id = counted_group_id(post)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    if "_old_group_id" in instance.__dict__:
+        # set by the caller from the post it loaded, see remember_group
+        return
+    instance._old_group_id = None
+    if instance.pk is not None:
+        old = Post.objects.filter(pk=instance.pk).only(
+            "group_id", "hidden", "deleted"
+        ).first()
+        if old is not None:
+            instance._old_group_id = counted_group_id(old)
+
+
+@receiver(post_save, sender=Post)
+def update_feeds(sender, instance, created, **kwargs):
+    # runs before update_group_stats, which forgets the old group
+    old_group_id = instance.__dict__.get("_old_group_id")
+    bump_versions(
+        post_scope_keys(instance, old_group_id), drop=not created
+    )
+    bump_page_versions(post_page_scopes(instance, old_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def drop_feeds(sender, instance, **kwargs):
+    bump_versions(post_scope_keys(instance), drop=True)
+    bump_page_versions(post_page_scopes(instance))
+
+
+@receiver(post_save, sender=Post)
+def update_group_stats(sender, instance, created, **kwargs):
+    old_group_id = instance.__dict__.pop("_old_group_id", None)
+    group_id = counted_group_id(instance)
+    if old_group_id == group_id:
+        return
+    if old_group_id is not None:
+        remove_post_from_group(old_group_id, instance.author_id)
+    if group_id is not None:
+        add_post_to_group(group_id, instance.author_id, instance.pub_date)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    group_id = counted_group_id(instance)
+    if group_id is not None:
+        remove_post_from_group(group_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def refresh_follow_suggestions(sender, instance, **kwargs):
+    mark_stale(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def drop_follow_set(sender, instance, **kwargs):
+    forget_follow_set(instance.user_id)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_hidden(sender, instance, **kwargs):
+    instance._was_counted = False
+    if instance.pk is not None:
+        instance._was_counted = Comment.objects.visible().filter(
+            pk=instance.pk,
+        ).exists()
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    counted = instance.is_visible
+    if counted == getattr(instance, "_was_counted", False):
+        return
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F("comment_count") + (1 if counted else -1)
+    )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if not instance.is_visible:
+        return
+    Post.objects.filter(
+        pk=instance.post_id,
+        comment_count__gt=0,
+    ).update(comment_count=F("comment_count") - 1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def drop_comment_pages(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).only(
+        "author_id", "group_id"
+    ).first()
+    if post is not None:
+        bump_page_versions(post_page_scopes(post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def drop_follow_pages(sender, instance, **kwargs):
+    bump_page_versions(
+        [f"author:{instance.author_id}", f"author:{instance.user_id}"]
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def drop_group_pages(sender, instance, **kwargs):
+    # the group is shown on the cards of its posts everywhere
+    bump_page_versions()
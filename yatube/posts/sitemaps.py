@@ -0,0 +1,213 @@
+"""Sitemaps of the posts, archived posts, profiles and groups, written
+to static files.
+
+Crawlers used to find the posts by paging through the index, the most
+expensive way to read them. The write_sitemaps command writes a sitemap
+index and, per section, sitemaps of at most SITEMAP_CHUNK_SIZE URLs to
+SITEMAP_ROOT, where nginx serves them. A section is read in keyset
+order, ``WHERE id > last ORDER BY id LIMIT n``, so the millionth row
+costs as much as the first, and streamed to the file without being held
+in memory.
+
+Chunks are cut by id and never move: new rows only go to the last chunk
+of a section, which is not full yet. The bounds of the chunks are kept
+in a manifest and a run rewrites only the chunks after the last full
+one; a full run also drops the URLs of posts deleted or hidden since.
+Archived posts keep their ids and URLs and are listed in a section of
+their own, read from the archive table.
+"""
+import json
+import os
+from itertools import chain, islice
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.urls import reverse
+
+from .models import ArchivedPost, Group, Post, User
+
+BATCH_SIZE = 5000
+MANIFEST = "manifest.json"
+INDEX = "sitemap.xml"
+XMLNS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+class Section:
+    """The rows of a sitemap section, with the id first, and the URL and
+    modification time of a row"""
+
+    def __init__(self, queryset, fields, location, lastmod=None):
+        self.queryset = queryset
+        self.fields = ("id", *fields)
+        self.location = location
+        self.lastmod = lastmod
+
+    def rows(self, after=0, batch_size=BATCH_SIZE):
+        """The rows with an id greater than ``after``, in batches"""
+        while True:
+            rows = list(
+                self.queryset().filter(id__gt=after).order_by("id")
+                .values_list(*self.fields)[:batch_size]
+            )
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+
+SECTIONS = {
+    "posts": Section(
+        lambda: Post.objects.visible(),
+        ("author__username", "pub_date"),
+        lambda row: reverse("post", args=[row[1], row[0]]),
+        lastmod=lambda row: row[2],
+    ),
+    "archived": Section(
+        lambda: ArchivedPost.objects.visible(),
+        ("author__username", "pub_date"),
+        lambda row: reverse("post", args=[row[1], row[0]]),
+        lastmod=lambda row: row[2],
+    ),
+    "profiles": Section(
+        lambda: User.objects.filter(is_active=True),
+        ("username",),
+        lambda row: reverse("profile", args=[row[1]]),
+    ),
+    "groups": Section(
+        lambda: Group.objects.all(),
+        ("slug", "last_post_date"),
+        lambda row: reverse("group", args=[row[1]]),
+        lastmod=lambda row: row[2],
+    ),
+}
+
+
+def w3c_date(value):
+    return value.isoformat(timespec="seconds")
+
+
+def replace_file(path, lines):
+    """Writes the lines to a temporary file moved over ``path``, so
+    that nginx never serves half a file"""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+    os.replace(temporary, path)
+
+
+def write_chunk(path, section, rows, base_url):
+    """Writes the rows to a sitemap; returns the manifest entry of the
+    chunk, or None if there were no rows"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return None
+    chunk = {"first": first[0], "last": None, "count": 0, "lastmod": None}
+
+    def lines():
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<urlset xmlns="{XMLNS}">\n'
+        )
+        for row in chain([first], rows):
+            chunk["last"] = row[0]
+            chunk["count"] += 1
+            url = escape(base_url + section.location(row))
+            lastmod = section.lastmod(row) if section.lastmod else None
+            if lastmod is None:
+                yield f"<url><loc>{url}</loc></url>\n"
+                continue
+            lastmod = w3c_date(lastmod)
+            chunk["lastmod"] = max(chunk["lastmod"] or lastmod, lastmod)
+            yield (
+                f"<url><loc>{url}</loc><lastmod>{lastmod}</lastmod></url>\n"
+            )
+        yield "</urlset>\n"
+
+    replace_file(path, lines())
+    return chunk
+
+
+def write_section(name, section, chunks, root, base_url, chunk_size):
+    """Rewrites the chunks of a section after the last full one of
+    ``chunks``; returns the manifest entries of all its chunks"""
+    kept = []
+    for chunk in chunks:
+        if chunk["count"] < chunk_size:
+            break
+        kept.append(chunk)
+    rows = section.rows(after=kept[-1]["last"] if kept else 0)
+    chunks = list(kept)
+    while True:
+        file_name = f"{name}-{len(chunks) + 1}.xml"
+        chunk = write_chunk(
+            os.path.join(root, file_name),
+            section,
+            islice(rows, chunk_size),
+            base_url,
+        )
+        if chunk is None:
+            return chunks
+        chunk["file"] = file_name
+        chunks.append(chunk)
+        if chunk["count"] < chunk_size:
+            return chunks
+
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_index(root, manifest, base_url):
+    def lines():
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<sitemapindex xmlns="{XMLNS}">\n'
+        )
+        for chunks in manifest["sections"].values():
+            for chunk in chunks:
+                url = escape(base_url + settings.SITEMAP_URL + chunk["file"])
+                lastmod = (
+                    f"<lastmod>{chunk['lastmod']}</lastmod>"
+                    if chunk["lastmod"] else ""
+                )
+                yield f"<sitemap><loc>{url}</loc>{lastmod}</sitemap>\n"
+        yield "</sitemapindex>\n"
+
+    replace_file(os.path.join(root, INDEX), lines())
+
+
+def write_sitemaps(full=False, root=None, base_url=None, chunk_size=None):
+    """Brings the sitemaps up to date; returns the manifest"""
+    root = root or settings.SITEMAP_ROOT
+    base_url = base_url or settings.SITEMAP_BASE_URL
+    chunk_size = chunk_size or settings.SITEMAP_CHUNK_SIZE
+    os.makedirs(root, exist_ok=True)
+    old = read_manifest(root)
+    if old is None or old["chunk_size"] != chunk_size:
+        full = True
+    manifest = {"chunk_size": chunk_size, "sections": {}}
+    for name, section in SECTIONS.items():
+        chunks = [] if full else old["sections"].get(name, [])
+        manifest["sections"][name] = write_section(
+            name, section, chunks, root, base_url, chunk_size
+        )
+    if old is not None:
+        files = {
+            chunk["file"]
+            for chunks in manifest["sections"].values()
+            for chunk in chunks
+        }
+        for chunks in old["sections"].values():
+            for chunk in chunks:
+                if chunk["file"] not in files:
+                    os.remove(os.path.join(root, chunk["file"]))
+    replace_file(
+        os.path.join(root, MANIFEST), [json.dumps(manifest, indent=1)]
+    )
+    write_index(root, manifest, base_url)
+    return manifest
@@ -0,0 +1,95 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Group, GroupAuthorStat, Post
+
+TOP_AUTHORS_NUMBER = 3
+
+
+def add_post_to_group(group_id, author_id, pub_date):
+    """Counts a new post of the author in the group"""
+    with transaction.atomic():
+        Group.objects.filter(pk=group_id).update(
+            post_count=F("post_count") + 1,
+            last_post_date=Greatest(
+                Coalesce("last_post_date", Value(pub_date)),
+                Value(pub_date),
+            ),
+        )
+        updated = GroupAuthorStat.objects.filter(
+            group_id=group_id,
+            author_id=author_id,
+        ).update(post_count=F("post_count") + 1)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    GroupAuthorStat.objects.create(
+                        group_id=group_id,
+                        author_id=author_id,
+                        post_count=1,
+                    )
+            except IntegrityError:
+                GroupAuthorStat.objects.filter(
+                    group_id=group_id,
+                    author_id=author_id,
+                ).update(post_count=F("post_count") + 1)
+
+
+def remove_post_from_group(group_id, author_id):
+    """Forgets a post of the author in the group"""
+    with transaction.atomic():
+        last_post_date = Post.objects.visible().filter(
+            group_id=group_id
+        ).values_list("pub_date", flat=True).first()
+        Group.objects.filter(pk=group_id, post_count__gt=0).update(
+            post_count=F("post_count") - 1,
+            last_post_date=last_post_date,
+        )
+        GroupAuthorStat.objects.filter(
+            group_id=group_id,
+            author_id=author_id,
+            post_count__gt=0,
+        ).update(post_count=F("post_count") - 1)
+        GroupAuthorStat.objects.filter(
+            group_id=group_id,
+            author_id=author_id,
+            post_count=0,
+        ).delete()
+
+
+def get_top_authors(group, number=TOP_AUTHORS_NUMBER):
+    return group.author_stats.select_related("author")[:number]
+
+
+def rebuild_group_stats(group_ids=None):
+    """Recounts the statistics of the given groups, or of all groups,
+    from scratch"""
+    groups = Group.objects.all()
+    stats = GroupAuthorStat.objects.all()
+    posts = Post.objects.visible().filter(group__isnull=False)
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+        stats = stats.filter(group_id__in=group_ids)
+        posts = posts.filter(group_id__in=group_ids)
+    with transaction.atomic():
+        stats.delete()
+        groups.update(post_count=0, last_post_date=None)
+        totals = posts.values(
+            "group_id"
+        ).annotate(
+            post_count=Count("id"),
+            last_post_date=Max("pub_date"),
+        ).order_by()
+        for row in totals:
+            Group.objects.filter(pk=row["group_id"]).update(
+                post_count=row["post_count"],
+                last_post_date=row["last_post_date"],
+            )
+        per_author = posts.values(
+            "group_id", "author_id"
+        ).annotate(post_count=Count("id")).order_by()
+        GroupAuthorStat.objects.bulk_create(
+            (GroupAuthorStat(**row) for row in per_author.iterator()),
+            batch_size=1000,
+        )
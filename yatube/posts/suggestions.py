@@ -0,0 +1,78 @@
+from django.db import transaction
+
+from .follow_graph import FollowGraph
+from .models import Follow, FollowSuggestion, StaleFollowSuggestions
+
+SUGGESTIONS_NUMBER = 10
+CHUNK_SIZE = 1000
+
+
+def get_suggestions(user, number=5):
+    """The suggestions of the user, without the authors followed since
+    the last refresh"""
+    return FollowSuggestion.objects.filter(
+        user_id=user.id
+    ).exclude(
+        author__following__user_id=user.id
+    ).select_related("author")[:number]
+
+
+def mark_stale(user_id, author_id=None):
+    """Queues the user whose subscription to ``author_id`` changed, and
+    the author, for the next incremental refresh, which adds the users
+    whose suggestions depend on them"""
+    StaleFollowSuggestions.objects.bulk_create(
+        [
+            StaleFollowSuggestions(user_id=stale_id)
+            for stale_id in (user_id, author_id) if stale_id is not None
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _save_chunk(graph, user_ids):
+    suggestions = [
+        FollowSuggestion(user_id=user_id, author_id=author_id, score=score)
+        for user_id in user_ids
+        for author_id, score in graph.suggest(user_id, SUGGESTIONS_NUMBER)
+    ]
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FollowSuggestion.objects.bulk_create(suggestions)
+        StaleFollowSuggestions.objects.filter(
+            user_id__in=user_ids
+        ).delete()
+    return len(suggestions)
+
+
+def refresh_suggestions(full=False, graph=None):
+    """Recomputes suggestions for the stale users, or for every
+    follower with ``full``; returns the number of refreshed users.
+
+    A subscription of a stale user changes the suggestions of its
+    followers, who are suggested the authors it follows, and of the
+    followers of the author, to whom it is a user with similar
+    subscriptions; both are found in the graph and refreshed with it.
+    """
+    if full:
+        users = set(Follow.objects.values_list(
+            "user_id", flat=True
+        ).order_by().distinct())
+        users.update(FollowSuggestion.objects.values_list(
+            "user_id", flat=True
+        ).order_by().distinct())
+    else:
+        users = set(StaleFollowSuggestions.objects.values_list(
+            "user_id", flat=True
+        ))
+    if not users:
+        return 0
+    if graph is None:
+        graph = FollowGraph.from_db()
+    if not full:
+        for stale_id in list(users):
+            users.update(graph.followers(stale_id))
+    user_ids = sorted(users)
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        _save_chunk(graph, user_ids[start:start + CHUNK_SIZE])
+    return len(user_ids)
@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.holes import hole_marker, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """Renders the user specific fragment ``name``, or leaves a hole
+    for it when the page is rendered to be shared, see posts.holes"""
+    request = context.get("request")
+    if request is None:
+        return ""
+    if getattr(request, "shared_page", False):
+        return hole_marker(name, params)
+    return mark_safe(render_hole(name, request, params))
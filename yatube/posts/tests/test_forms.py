@@ -1,13 +1,19 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Comment, Post, User
+from posts.writes import add_comment
 
 
 class PostCreateFormTests(TestCase):
@@ -88,6 +94,41 @@ class PostCreateFormTests(TestCase):
             ).image
         )
 
+    def make_jpeg(self, name):
+        content = BytesIO()
+        exif = Image.Exif()
+        exif[0x010e] = "secret description"
+        Image.new("RGB", (4, 4), "red").save(content, "JPEG", exif=exif)
+        return SimpleUploadedFile(
+            name=name,
+            content=content.getvalue(),
+            content_type="image/jpeg"
+        )
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом без метаданных"""
+        for name in ("first.jpg", "second.jpg"):
+            self.authorized_client.post(
+                reverse("new"),
+                data={"text": name, "image": self.make_jpeg(name)},
+            )
+        first = Post.objects.get(text="first.jpg").image
+        second = Post.objects.get(text="second.jpg").image
+        self.assertEqual(first.name, second.name)
+        with Image.open(first.path) as image:
+            self.assertNotIn(0x010e, image.getexif())
+
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_cant_upload_too_large_image(self):
+        """Слишком большая картинка не принимается"""
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse("new"),
+            data={"text": "too large", "image": self.make_jpeg("big.jpg")},
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertTrue(response.context["form"].errors.get("image"))
+
     def test_edit_post(self):
         """Пост можно изменить"""
         post_count = Post.objects.count()
@@ -112,6 +153,25 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    def test_edit_post_needs_author_in_url(self):
+        """Пост не редактируется по адресу с чужим именем"""
+        other = User.objects.create(username="other_editor")
+        response = self.authorized_client.post(
+            reverse("post_edit", args=[other.username, self.post.id]),
+            data={"text": "Wrong url"},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Post.objects.filter(text="Wrong url").exists())
+
+    def test_hidden_post_cant_be_edited(self):
+        """Скрытый модератором пост нельзя открыть и сохранить"""
+        Post.objects.filter(pk=self.post.pk).update(hidden=True)
+        url = reverse("post_edit", args=[self.user.username, self.post.id])
+        self.assertEqual(self.authorized_client.get(url).status_code, 404)
+        response = self.authorized_client.post(url, data={"text": "Back"})
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(Post.objects.get(pk=self.post.pk).hidden)
+
     def test_cant_create_void_post(self):
         """Нельзя создать пустой пост"""
         posts_count = Post.objects.count()
@@ -193,3 +253,104 @@ class CommentFormTest(TestCase):
             follow=True
         )
         self.assertFalse(Comment.objects.exists())
+
+    def test_reply_is_shown_under_its_parent(self):
+        """Ответ отображается сразу под комментарием"""
+        kwargs = {"username": self.author.username, "post_id": self.post.id}
+        first = Comment.objects.create(
+            post=self.post, author=self.author, text="first"
+        )
+        second = Comment.objects.create(
+            post=self.post, author=self.author, text="second"
+        )
+        response = self.authorized_client.post(
+            reverse("comment", kwargs=kwargs),
+            data={"text": "reply", "parent": first.id},
+            follow=True
+        )
+        comments = list(response.context["comments"])
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ["first", "reply", "second"]
+        )
+        self.assertEqual(comments[1].parent, first)
+        self.assertEqual(comments[1].depth, 1)
+        self.assertEqual(second.depth, 0)
+
+    def test_comment_needs_visible_post_of_the_author(self):
+        """Комментарий к чужому адресу или скрытому посту не создается"""
+        hidden = Post.objects.create(
+            text="hidden", author=self.author, hidden=True
+        )
+        for username, post_id in ((self.user.username, self.post.id),
+                                  (self.author.username, hidden.id),
+                                  (self.author.username, 10 ** 6)):
+            with self.subTest(username=username, post_id=post_id):
+                response = self.authorized_client.post(
+                    reverse("comment", args=[username, post_id]),
+                    data={"text": "lost"},
+                )
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_deep_reply_goes_to_the_parent_of_the_parent(self):
+        """Слишком глубокий ответ прикрепляется к родителю родителя"""
+        parent = None
+        for depth in range(Comment.MAX_DEPTH + 1):
+            parent = Comment.objects.create(
+                post=self.post, author=self.author, text=str(depth),
+                parent=parent,
+            )
+        comment = add_comment(self.post.id, self.user.id, "deep", parent.id)
+        saved = Comment.objects.get(pk=comment.id)
+        self.assertEqual(saved.parent_id, parent.parent_id)
+        self.assertEqual(saved.depth, Comment.MAX_DEPTH)
+        self.assertEqual(saved.path, comment.path)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, Comment.MAX_DEPTH + 2)
+
+    def test_comment_is_written_with_two_statements(self):
+        """Комментарий пишется двумя запросами, сразу с полным путем"""
+        parent = Comment.objects.create(
+            post=self.post, author=self.author, text="parent"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            comment = add_comment(
+                self.post.id, self.user.id, "reply", parent.id,
+                self.author.username,
+            )
+        statements = [
+            query["sql"] for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertEqual(len(statements), 2)
+        saved = Comment.objects.get(pk=comment.id)
+        self.assertEqual(saved.path, f"{parent.path}{comment.id:010d}/")
+        self.assertEqual(saved.parent_id, parent.id)
+
+    def test_comments_are_loaded_without_extra_queries(self):
+        """Число запросов не зависит от числа комментариев"""
+        kwargs = {"username": self.author.username, "post_id": self.post.id}
+        url = reverse("post", kwargs=kwargs)
+        Comment.objects.create(post=self.post, author=self.user, text="0")
+        with CaptureQueriesContext(connection) as few:
+            self.guest_client.get(url)
+        for i in range(10):
+            Comment.objects.create(
+                post=self.post, author=self.author, text=str(i)
+            )
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.guest_client.get(url)
+        self.assertEqual(len(few), len(many))
+
+    def test_comment_count_follows_comments(self):
+        """Счетчик комментариев поста обновляется"""
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text="counted"
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
@@ -1,6 +1,23 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
 
-from posts.models import Group, Post, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.admin import EstimatedCountPaginator
+from posts.archive import archive_posts, purge_deleted
+from posts.models import (ArchivedComment, ArchivedPost, Comment, Group,
+                          GroupAuthorStat, ModerationJob, Post, User)
+from posts.moderation import claim_job, run_job
+from posts.partitioning import (add_months, create_partitions,
+                                existing_partitions, months_between,
+                                partition_name, partition_tables)
 
 
 class PostsModelsTest(TestCase):
@@ -31,3 +48,340 @@ class PostsModelsTest(TestCase):
         post = PostsModelsTest.post
         expected_post_object_name = post.text[:15]
         self.assertEqual(expected_post_object_name, str(post))
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.groups = [Group.objects.create(
+            title=f"group {i}",
+            slug=f"group-{i}"
+        ) for i in range(2)]
+        cls.author = User.objects.create(username="stats_author")
+
+    def test_new_post_updates_group_stats(self):
+        """Новый пост увеличивает счетчики группы"""
+        post = Post.objects.create(
+            text="counted",
+            author=self.author,
+            group=self.groups[0],
+        )
+        group = Group.objects.get(pk=self.groups[0].pk)
+        self.assertEqual(group.post_count, 1)
+        self.assertEqual(group.last_post_date, post.pub_date)
+        stat = GroupAuthorStat.objects.get(group=group, author=self.author)
+        self.assertEqual(stat.post_count, 1)
+
+    def test_moved_post_updates_both_groups(self):
+        """Перенос поста в другую группу пересчитывает обе группы"""
+        post = Post.objects.create(
+            text="moved",
+            author=self.author,
+            group=self.groups[0],
+        )
+        post.group = self.groups[1]
+        post.save()
+        old_group = Group.objects.get(pk=self.groups[0].pk)
+        new_group = Group.objects.get(pk=self.groups[1].pk)
+        self.assertEqual(old_group.post_count, 0)
+        self.assertIsNone(old_group.last_post_date)
+        self.assertEqual(new_group.post_count, 1)
+        self.assertFalse(
+            GroupAuthorStat.objects.filter(group=old_group).exists()
+        )
+
+    def test_deleted_post_updates_group_stats(self):
+        """Удаление поста уменьшает счетчики группы"""
+        first = Post.objects.create(
+            text="first",
+            author=self.author,
+            group=self.groups[0],
+        )
+        second = Post.objects.create(
+            text="second",
+            author=self.author,
+            group=self.groups[0],
+        )
+        second.delete()
+        group = Group.objects.get(pk=self.groups[0].pk)
+        self.assertEqual(group.post_count, 1)
+        self.assertEqual(group.last_post_date, first.pub_date)
+
+
+class ModerationJobTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(title="spam", slug="spam")
+        self.other_group = Group.objects.create(title="ok", slug="ok")
+        self.spammer = User.objects.create(username="spammer")
+        self.reader = User.objects.create(username="reader")
+        self.reader_post = Post.objects.create(
+            text="reader post",
+            author=self.reader,
+            group=self.group,
+        )
+        self.spam = [Post.objects.create(
+            text=f"spam {i}",
+            author=self.spammer,
+            group=self.group,
+        ) for i in range(3)]
+        self.spam_comment = Comment.objects.create(
+            post=self.reader_post,
+            author=self.spammer,
+            text="spam comment",
+        )
+        self.reply = Comment.objects.create(
+            post=self.reader_post,
+            author=self.reader,
+            parent=self.spam_comment,
+            text="reply",
+        )
+        Comment.objects.create(
+            post=self.spam[0],
+            author=self.reader,
+            text="comment on spam",
+        )
+
+    def run_job(self, **fields):
+        ModerationJob.objects.create(author=self.spammer, **fields)
+        return run_job(claim_job())
+
+    def test_delete_removes_author_content(self):
+        """Удаление убирает записи автора, его комментарии и ответы"""
+        job = self.run_job(action=ModerationJob.DELETE)
+        self.assertEqual(job.status, ModerationJob.DONE)
+        self.assertEqual(job.processed, job.total)
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+        self.assertEqual(Comment.objects.count(), 0)
+        self.reader_post.refresh_from_db()
+        self.assertEqual(self.reader_post.comment_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+
+    def test_hide_and_show(self):
+        """Скрытые записи пропадают из лент и возвращаются обратно"""
+        self.run_job(action=ModerationJob.HIDE)
+        self.assertEqual(
+            list(Post.objects.visible()), [self.reader_post]
+        )
+        self.reader_post.refresh_from_db()
+        self.assertEqual(self.reader_post.comment_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        self.run_job(action=ModerationJob.SHOW)
+        self.assertEqual(Post.objects.visible().count(), 4)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 4)
+
+    def test_hidden_posts_leave_feeds_and_pages(self):
+        """Скрытые записи сразу пропадают из лент и с главной"""
+        cache.clear()
+        feed_url = reverse("index_feed", args=["atom"])
+        self.assertContains(self.client.get(feed_url), "spam 0")
+        self.assertContains(self.client.get(reverse("index")), "spam 0")
+        self.run_job(action=ModerationJob.HIDE)
+        self.assertNotContains(self.client.get(feed_url), "spam 0")
+        self.client.force_login(self.reader)
+        self.assertNotContains(self.client.get(reverse("index")), "spam 0")
+        cache.clear()
+
+    def test_jobs_reach_archived_content(self):
+        """Модерация скрывает и удаляет и архивные записи автора"""
+        cache.clear()
+        Post.objects.filter(
+            pk__in=[self.spam[0].pk, self.spam[1].pk]
+        ).update(pub_date=timezone.now() - timedelta(days=400))
+        archive_posts(before=timezone.now() - timedelta(days=365))
+        profile_url = reverse("profile", args=[self.spammer.username])
+        post_url = reverse(
+            "post", args=[self.spammer.username, self.spam[0].pk]
+        )
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(post_url), "spam 0")
+        job = self.run_job(action=ModerationJob.HIDE)
+        self.assertEqual(job.total, 4)
+        self.assertFalse(
+            ArchivedPost.objects.visible().filter(author=self.spammer)
+        )
+        self.assertEqual(self.client.get(post_url).status_code, 404)
+        self.assertNotContains(self.client.get(profile_url), "spam 0")
+        job = self.run_job(action=ModerationJob.DELETE)
+        self.assertEqual(job.processed, job.total)
+        self.assertFalse(ArchivedPost.objects.filter(author=self.spammer))
+        self.assertFalse(ArchivedComment.objects.exists())
+        cache.clear()
+
+    def test_move_to_other_group(self):
+        """Записи автора переносятся в другую группу"""
+        self.run_job(
+            action=ModerationJob.MOVE,
+            target_group=self.other_group,
+        )
+        self.assertEqual(self.other_group.posts.count(), 3)
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        self.assertEqual(self.other_group.post_count, 3)
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(title="archive", slug="archive")
+        self.author = User.objects.create(username="old_author")
+        self.old_post = Post.objects.create(
+            text="old post",
+            author=self.author,
+            group=self.group,
+        )
+        self.new_post = Post.objects.create(
+            text="new post",
+            author=self.author,
+            group=self.group,
+        )
+        comment = Comment.objects.create(
+            post=self.old_post,
+            author=self.author,
+            text="old comment",
+        )
+        Comment.objects.create(
+            post=self.old_post,
+            author=self.author,
+            parent=comment,
+            text="old reply",
+        )
+        self.year_ago = timezone.now() - timedelta(days=400)
+        Post.objects.filter(pk=self.old_post.pk).update(
+            pub_date=self.year_ago
+        )
+
+    def test_old_posts_are_moved_to_archive(self):
+        """Старые посты переносятся в архив вместе с комментариями"""
+        archived = archive_posts(
+            before=timezone.now() - timedelta(days=365)
+        )
+        self.assertEqual(archived, 1)
+        self.assertEqual(list(Post.objects.all()), [self.new_post])
+        post = ArchivedPost.objects.get(pk=self.old_post.pk)
+        self.assertEqual(post.comment_count, 2)
+        self.assertEqual(post.pub_date, self.year_ago)
+        self.assertEqual(
+            [comment.depth for comment in post.comments.order_by("path")],
+            [0, 1],
+        )
+        self.assertFalse(Comment.objects.exists())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+
+    def test_archived_and_purged_posts_leave_feeds(self):
+        """Архивированные и удаленные посты пропадают из лент"""
+        cache.clear()
+        feed_url = reverse("group_feed", args=[self.group.slug, "atom"])
+        self.assertContains(self.client.get(feed_url), "old post")
+        archive_posts(before=timezone.now() - timedelta(days=365))
+        self.assertNotContains(self.client.get(feed_url), "old post")
+        Post.objects.filter(pk=self.new_post.pk).update(
+            deleted=timezone.now() - timedelta(days=40)
+        )
+        purge_deleted(before=timezone.now() - timedelta(days=30))
+        self.assertNotContains(self.client.get(feed_url), "new post")
+        cache.clear()
+
+    def test_deleted_posts_are_purged_after_retention(self):
+        """Удаленные посты убираются окончательно после срока хранения"""
+        Post.objects.filter(pk=self.new_post.pk).update(
+            deleted=timezone.now() - timedelta(days=40)
+        )
+        purged = purge_deleted(before=timezone.now() - timedelta(days=30))
+        self.assertEqual(purged, 1)
+        self.assertFalse(Post.objects.filter(pk=self.new_post.pk).exists())
+        self.assertEqual(ArchivedComment.objects.count(), 0)
+
+    def test_purge_keeps_live_replies(self):
+        """Удаленный комментарий с живыми ответами не убирается"""
+        comment, reply = Comment.objects.order_by("path")
+        long_ago = timezone.now() - timedelta(days=40)
+        before = timezone.now() - timedelta(days=30)
+        Comment.objects.filter(pk=comment.pk).update(deleted=long_ago)
+        self.assertEqual(purge_deleted(before=before), 0)
+        self.assertEqual(Comment.objects.count(), 2)
+        Comment.objects.filter(pk=reply.pk).update(deleted=long_ago)
+        self.assertEqual(purge_deleted(before=before), 2)
+        self.assertFalse(Comment.objects.exists())
+
+
+class PartitioningTest(TestCase):
+    def test_months_are_iterated_across_years(self):
+        """Месяцы перечисляются с переходом через год"""
+        self.assertEqual(add_months(date(2026, 11, 15), 3), date(2027, 2, 1))
+        self.assertEqual(
+            list(months_between(date(2026, 11, 20), date(2027, 1, 1))),
+            [date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1)],
+        )
+        self.assertEqual(
+            partition_name("posts_post", date(2027, 1, 1)),
+            "posts_post_y2027m01",
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "needs Postgres")
+    @override_settings(POST_PARTITIONING=True)
+    def test_tables_are_partitioned_by_month(self):
+        """Таблицы делятся по месяцам без секции по умолчанию, и лента
+        читает секции по порядку"""
+        author = User.objects.create(username="partitioned")
+        old = Post.objects.create(text="old", author=author)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timedelta(days=100)
+        )
+        self.assertEqual(
+            partition_tables(), ["posts_post", "posts_comment"]
+        )
+        with connection.cursor() as cursor:
+            partitions = existing_partitions(cursor, "posts_post")
+            self.assertNotIn("posts_post_default", partitions)
+            self.assertIn(
+                partition_name("posts_post", timezone.now().date()),
+                partitions,
+            )
+            self.assertEqual(create_partitions(), [])
+            new = Post.objects.create(text="new", author=author)
+            self.assertEqual(
+                list(Post.objects.values_list("id", flat=True)),
+                [new.id, old.id],
+            )
+            # the tables are tiny, make the planner use the indexes
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(
+                "EXPLAIN SELECT id FROM posts_post "
+                "ORDER BY pub_date DESC LIMIT 10"
+            )
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertNotIn("Merge Append", plan)
+        self.assertNotIn("Sort", plan)
+
+    @skipUnless(connection.vendor == "postgresql", "needs Postgres")
+    @override_settings(POST_PARTITIONING=True)
+    def test_admin_estimates_partitioned_tables(self):
+        """Число записей секционированной таблицы берется из статистики
+        ее секций"""
+        author = User.objects.create(username="estimated")
+        Post.objects.bulk_create(
+            Post(text=f"post {i}", author=author) for i in range(3)
+        )
+        partition_tables()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE posts_post")
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        paginator.estimate_from = 1
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 3)
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in queries)
+        )
+
+    @override_settings(POST_PARTITIONING=True)
+    def test_partitioning_is_skipped_without_postgres(self):
+        """Без Postgres секции не создаются и ничего не ломается"""
+        self.assertEqual(create_partitions(), [])
+        output = StringIO()
+        call_command("create_partitions", "--convert", stdout=output)
+        self.assertIn("Partitioning is off", output.getvalue())
@@ -30,6 +30,7 @@ class PostsURLTests(TestCase):
         self.slug = self.group.slug
         urls = (
             "/",
+            "/group/",
             f"/{self.author.username}/",
             f"/group/{self.group.slug}/",
             f"/{self.author.username}/{self.post.id}/",
@@ -85,3 +86,22 @@ class PostsURLTests(TestCase):
             with self.subTest(url=url):
                 response = self.authorized_client.get(url)
                 self.assertTemplateUsed(response, template)
+
+    def test_admin_changelists_available_for_staff(self):
+        """Списки постов и комментариев в админке открываются"""
+        admin = User.objects.create(
+            username="admin", is_staff=True, is_superuser=True
+        )
+        self.authorized_client.force_login(admin)
+        urls = (
+            "/admin/posts/post/",
+            "/admin/posts/post/?q=text",
+            "/admin/posts/comment/",
+            "/admin/posts/follow/",
+            "/admin/posts/moderationjob/",
+            "/admin/posts/moderationjob/add/",
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
@@ -1,6 +1,9 @@
+import hashlib
 import shutil
 import tempfile
 import time
+import zlib
+from datetime import timedelta
 
 from django import forms
 from django.conf import settings
@@ -8,8 +11,22 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from posts.models import Follow, Group, Post, User
+from posts.archive import archive_posts
+from posts.follow_graph import FollowGraph
+from posts.follows import followed_among, is_following
+from posts.loaders import Loaders
+from posts.models import (Comment, Follow, Group, Post,
+                          StaleFollowSuggestions, User)
+from posts.prepared import PreparedPost
+from posts.ranking import refresh_ranking
+from posts.sitemaps import write_sitemaps
+from posts.suggestions import get_suggestions, refresh_suggestions
+from posts.writes import follow
+from yatube.compression import choose_encoding
+from yatube.ratelimit import TokenBucket
+from yatube.warmup import warm_up_templates
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -131,6 +148,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+@override_settings(PAGE_SIZES={**settings.PAGE_SIZES, "index": 10})
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -218,6 +236,8 @@ class ImageViewTest(TestCase):
             content=small_gif,
             content_type="image/gif"
         )
+        digest = hashlib.sha256(small_gif).hexdigest()
+        ImageViewTest.image_name = f"posts/{digest[:2]}/{digest}.gif"
         ImageViewTest.user = User.objects.create(username="sergi")
         ImageViewTest.group = Group.objects.create(
             slug="test-slug"
@@ -242,7 +262,7 @@ class ImageViewTest(TestCase):
         """В контексте главной страницы у поста есть поле image"""
         response = self.guest_client.get(reverse("index"))
         first_post = response.context.get("page").object_list[0]
-        self.assertEqual(first_post.image, "posts/small.gif")
+        self.assertEqual(first_post.image, self.image_name)
 
     def test_profilr_post_has_image_in_context(self):
         """В контексте профиля у поста есть поле image"""
@@ -250,7 +270,7 @@ class ImageViewTest(TestCase):
             reverse("profile", kwargs={"username": self.user.username})
         )
         first_post = response.context.get("page").object_list[0]
-        self.assertEqual(first_post.image, "posts/small.gif")
+        self.assertEqual(first_post.image, self.image_name)
 
     def test_group_post_has_image_in_context(self):
         """В контексте группы у поста есть поле image"""
@@ -258,7 +278,7 @@ class ImageViewTest(TestCase):
             reverse("group", kwargs={"slug": "test-slug"})
         )
         first_post = response.context.get("page").object_list[0]
-        self.assertEqual(first_post.image, "posts/small.gif")
+        self.assertEqual(first_post.image, self.image_name)
 
     def test_post_has_image_in_context(self):
         """В контексте отдельного поста есть поле image"""
@@ -267,7 +287,19 @@ class ImageViewTest(TestCase):
                                     "post_id": self.post.id})
         )
         post = response.context.get("post")
-        self.assertEqual(post.image, "posts/small.gif")
+        self.assertEqual(post.image, self.image_name)
+
+    def test_original_image_is_sent_by_nginx(self):
+        """Оригинал картинки отдается через X-Accel-Redirect"""
+        response = self.guest_client.get(
+            reverse("post_image", kwargs={"username": self.user.username,
+                                          "post_id": self.post.id})
+        )
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"/protected-media/{self.image_name}"
+        )
+        self.assertIn("max-age", response["Cache-Control"])
 
 
 class CacheViewTest(TestCase):
@@ -337,6 +369,24 @@ class FollowViewTest(TestCase):
             user=self.follower, author=self.author
         ).exists())
 
+    def test_follow_is_one_statement_and_idempotent(self):
+        """Подписка - один запрос, повторная ничего не меняет"""
+        with self.assertNumQueries(3):
+            # the insert, the savepoint and its release
+            self.assertIsNone(follow(self.follower.id, "nobody"))
+        follow(self.follower.id, self.author.username)
+        self.assertIsNone(follow(self.follower.id, self.author.username))
+        self.assertIsNone(follow(self.author.id, self.author.username))
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_unfollow_without_follow_is_ignored(self):
+        """Отписка без подписки не вызывает ошибки"""
+        response = self.authorized_client.get(
+            reverse("profile_unfollow",
+                    kwargs={"username": self.author.username})
+        )
+        self.assertEqual(response.status_code, 302)
+
     def test_post_is_displayed_for_follower(self):
         """Пост ображается для подписчика"""
         Follow.objects.create(
@@ -351,3 +401,642 @@ class FollowViewTest(TestCase):
         """Пост не ображается для не подписчика"""
         response = self.authorized_client.get(reverse("follow_index"))
         self.assertFalse(response.context.get("page").object_list)
+
+
+class PopularViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        PopularViewTest.author = User.objects.create(username="popular")
+        PopularViewTest.reader = User.objects.create(username="reader")
+        PopularViewTest.posts = [Post.objects.create(
+            text=f"post {i}",
+            author_id=PopularViewTest.author.id,
+        ) for i in range(3)]
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_commented_post_is_first(self):
+        """Пост с комментариями поднимается в популярном"""
+        commented = self.posts[0]
+        for i in range(20):
+            Comment.objects.create(
+                post=commented,
+                author=self.reader,
+                text=str(i),
+            )
+        refresh_ranking(full=True)
+        response = self.client.get(reverse("popular"))
+        page = response.context.get("page")
+        self.assertEqual(len(page.object_list), 3)
+        self.assertEqual(page.object_list[0], commented)
+
+    def test_refresh_scores_only_changed_posts(self):
+        """Повторный запуск пересчитывает только измененные посты"""
+        self.assertEqual(refresh_ranking(), 3)
+        self.assertEqual(refresh_ranking(), 0)
+        Comment.objects.create(
+            post=self.posts[1],
+            author=self.reader,
+            text="new comment",
+        )
+        self.assertEqual(refresh_ranking(), 1)
+
+
+class FollowSuggestionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        FollowSuggestionTest.users = [
+            User.objects.create(username=f"user{i}") for i in range(4)
+        ]
+        first, second, third, fourth = FollowSuggestionTest.users
+        Follow.objects.create(user=first, author=second)
+        Follow.objects.create(user=second, author=third)
+        Follow.objects.create(user=fourth, author=second)
+        Follow.objects.create(user=fourth, author=third)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.users[0])
+        cache.clear()
+
+    def test_graph_suggests_friends_of_friends(self):
+        """Подписки подписок предлагаются первыми"""
+        graph = FollowGraph.from_edges(
+            [(0, 1), (1, 2), (3, 1), (3, 2)], 4
+        )
+        self.assertEqual(list(graph.followers(1)), [0, 3])
+        suggested = [author for author, _ in graph.suggest(0)]
+        self.assertEqual(suggested, [2])
+
+    def test_profile_shows_suggestions(self):
+        """На странице профиля есть рекомендации"""
+        refresh_suggestions(full=True)
+        response = self.authorized_client.get(
+            reverse("profile", kwargs={"username": self.users[1].username})
+        )
+        suggestions = response.context.get("suggestions")
+        self.assertEqual(
+            [suggestion.author for suggestion in suggestions],
+            [self.users[2]],
+        )
+
+    def test_follow_marks_suggestions_stale(self):
+        """Подписка убирает рекомендацию до следующего пересчета"""
+        refresh_suggestions(full=True)
+        self.authorized_client.get(
+            reverse("profile_follow",
+                    kwargs={"username": self.users[2].username})
+        )
+        self.assertFalse(get_suggestions(self.users[0]))
+        # the follower, the author and the other followers of the author
+        self.assertEqual(refresh_suggestions(), 4)
+
+    def test_refresh_adds_followers_of_stale_users(self):
+        """Подписка отмечает только пользователя и автора, пересчет
+        добавляет их подписчиков"""
+        first, second, third, fourth = self.users
+        for user, author, refreshed in (
+            (first, third, 4),
+            (second, fourth, 3),
+        ):
+            with self.subTest(user=user, author=author):
+                StaleFollowSuggestions.objects.all().delete()
+                follow(user.id, author.username)
+                self.assertEqual(
+                    set(StaleFollowSuggestions.objects.values_list(
+                        "user_id", flat=True
+                    )),
+                    {user.id, author.id},
+                )
+                self.assertEqual(refresh_suggestions(), refreshed)
+                self.assertFalse(StaleFollowSuggestions.objects.exists())
+
+
+class TemplateWarmupTest(TestCase):
+    def test_all_templates_compile(self):
+        """Все шаблоны компилируются при прогреве"""
+        compiled, failed = warm_up_templates()
+        self.assertFalse(failed)
+        self.assertIn("index.html", compiled)
+        self.assertIn("include/post_item.html", compiled)
+
+
+class ArchiveViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="archived_author")
+        posts = [Post.objects.create(
+            text=f"post {i}",
+            author=cls.author,
+        ) for i in range(15)]
+        old_ids = [post.pk for post in posts[:8]]
+        Post.objects.filter(pk__in=old_ids).update(
+            pub_date=timezone.now() - timedelta(days=400)
+        )
+        archive_posts(before=timezone.now() - timedelta(days=365))
+        cls.archived_id = old_ids[0]
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_profile_pages_into_archive(self):
+        """Профиль листает сначала новые посты, затем архивные"""
+        first = self.client.get(
+            reverse("profile", args=[self.author.username])
+        )
+        self.assertEqual(first.context["post_count"], 15)
+        self.assertEqual(len(first.context["page"]), 10)
+        second = self.client.get(
+            reverse("profile", args=[self.author.username]) + "?page=2"
+        )
+        self.assertEqual(len(second.context["page"]), 5)
+        self.assertTrue(all(
+            getattr(post, "archived", False)
+            for post in second.context["page"]
+        ))
+
+    def test_archived_post_page_is_available(self):
+        """Страница архивного поста открывается по прежнему адресу"""
+        response = self.client.get(
+            reverse("post", args=[self.author.username, self.archived_id])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["post"].archived)
+
+
+@override_settings(RATELIMITS={**settings.RATELIMITS, "follow": "2/m"})
+class RateLimitTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="limited")
+        cls.author = User.objects.create(username="popular_author")
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_follow_is_limited_with_retry_after(self):
+        """Лишние подписки отклоняются с заголовком Retry-After"""
+        url = reverse("profile_follow", args=[self.author.username])
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, 302)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+    def test_bucket_refills_with_time(self):
+        """Токены восстанавливаются со временем"""
+        bucket = TokenBucket("follow")
+        self.assertEqual(bucket.consume("client", now=1000), 0)
+        self.assertEqual(bucket.consume("client", now=1000), 0)
+        self.assertAlmostEqual(bucket.consume("client", now=1000), 30)
+        self.assertEqual(bucket.consume("client", now=1030), 0)
+
+
+class CompressionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create(username="verbose")
+        Post.objects.bulk_create(
+            Post(text="long text " * 50, author=author) for _ in range(10)
+        )
+
+    def test_page_is_gzipped(self):
+        """Страница сжимается gzip, если клиент его принимает"""
+        response = self.client.get(
+            reverse("profile", args=["verbose"]),
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        html = zlib.decompress(response.content, 31).decode()
+        self.assertIn("long text", html)
+
+    def test_page_is_not_compressed_without_accept_encoding(self):
+        """Без Accept-Encoding ответ не сжимается"""
+        response = self.client.get(reverse("profile", args=["verbose"]))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_encoding_follows_quality_values(self):
+        """Выбирается принятое клиентом кодирование с наибольшим q"""
+        self.assertEqual(choose_encoding("gzip;q=1, br;q=0"), "gzip")
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIn(choose_encoding("*"), ("zstd", "br", "gzip"))
+
+
+class SharedPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="shared_author")
+        cls.reader = User.objects.create(username="shared_reader")
+        cls.post = Post.objects.create(text="shared text", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.url = reverse("post", args=[self.author.username, self.post.id])
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_anonymous_page_is_public_and_cached(self):
+        """Страница гостя кэшируется целиком и помечена как публичная"""
+        first = self.client.get(self.url)
+        self.assertIn("public", first["Cache-Control"])
+        self.assertIn("Войти", first.content.decode())
+        second = self.client.get(self.url)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+
+    def test_users_share_body_with_own_fragments(self):
+        """Пользователи получают общую страницу со своими фрагментами"""
+        author_page = self.author_client.get(self.url)
+        self.assertIn("private", author_page["Cache-Control"])
+        html = author_page.content.decode()
+        self.assertIn("Пользователь: shared_author", html)
+        self.assertIn(
+            reverse("post_edit", args=["shared_author", self.post.id]), html
+        )
+        self.assertNotIn("Подписаться", html)
+        self.assertNotIn("<!--hole:", html)
+        reader_page = self.reader_client.get(self.url)
+        self.assertIsNone(reader_page.context.get("post"))
+        html = reader_page.content.decode()
+        self.assertIn("Пользователь: shared_reader", html)
+        self.assertNotIn("Редактировать", html)
+        self.assertIn("Подписаться", html)
+        self.assertIn("csrfmiddlewaretoken", html)
+
+    def test_writes_drop_shared_bodies(self):
+        """После изменений пользователи видят свежую страницу"""
+        self.reader_client.get(self.url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text="fresh comment"
+        )
+        response = self.reader_client.get(self.url)
+        self.assertContains(response, "fresh comment")
+
+    def test_writes_keep_other_scopes(self):
+        """Запись сбрасывает только страницы своих областей"""
+        other = User.objects.create(username="shared_other")
+        other_url = reverse("profile", args=[other.username])
+        self.reader_client.get(other_url)
+        self.reader_client.get(self.url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text="scoped comment"
+        )
+        response = self.reader_client.get(other_url)
+        self.assertIsNone(response.context.get("profile"))
+        response = self.reader_client.get(self.url)
+        self.assertContains(response, "scoped comment")
+        Follow.objects.create(user=self.reader, author=other)
+        response = self.reader_client.get(other_url)
+        self.assertEqual(response.context.get("following_number"), 1)
+
+
+class LoaderTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username="loader_reader")
+        cls.authors = [
+            User.objects.create(username=f"loader_{i}") for i in range(3)
+        ]
+        cls.group = Group.objects.create(title="loaded", slug="loaded")
+        for author in cls.authors:
+            Post.objects.create(text="loaded", author=author, group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def test_attach_queries_each_model_once(self):
+        """Связанные объекты загружаются одним запросом на модель"""
+        loaders = Loaders()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(2):
+            loaders.attach(posts, "author", "group")
+            self.assertEqual(
+                {post.author for post in posts}, set(self.authors)
+            )
+            self.assertEqual({post.group for post in posts}, {self.group})
+        with self.assertNumQueries(0):
+            loaders.users_by_username.get("loader_1")
+
+    def test_objects_are_loaded_together(self):
+        """Объекты загружаются одним запросом и запоминаются"""
+        loaders = Loaders()
+        ids = [author.id for author in self.authors]
+        with self.assertNumQueries(1):
+            users = loaders.users.get_many(ids)
+            self.assertEqual(
+                [users[author_id] for author_id in ids], self.authors
+            )
+            self.assertEqual(loaders.users.get(ids[0]), self.authors[0])
+
+    def test_follow_state(self):
+        """Состояние подписки запоминается на время запроса"""
+        follows = Loaders().follows
+        follows.want((self.reader.id, author.id) for author in self.authors)
+        with self.assertNumQueries(1):
+            self.assertTrue(follows.get(self.reader.id, self.authors[0].id))
+            self.assertFalse(follows.get(self.reader.id, self.authors[1].id))
+            self.assertFalse(follows.get(self.reader.id, self.authors[2].id))
+
+
+class FollowSetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="set_user")
+        cls.authors = [
+            User.objects.create(username=f"set_author_{i}") for i in range(4)
+        ]
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_follows_are_answered_from_cache(self):
+        """Подписки проверяются по кэшу без запросов к базе"""
+        author_ids = [author.id for author in self.authors]
+        self.assertEqual(
+            followed_among(self.user.id, author_ids), set(author_ids[:2])
+        )
+        with self.assertNumQueries(0):
+            self.assertTrue(is_following(self.user.id, author_ids[0]))
+            self.assertFalse(is_following(self.user.id, author_ids[3]))
+            self.assertEqual(
+                followed_among(self.user.id, author_ids),
+                set(author_ids[:2]),
+            )
+
+    def test_follow_and_unfollow_drop_the_set(self):
+        """Подписка и отписка сбрасывают кэш подписок"""
+        author = self.authors[3]
+        self.assertFalse(is_following(self.user.id, author.id))
+        self.client.get(reverse("profile_follow", args=[author.username]))
+        self.assertTrue(is_following(self.user.id, author.id))
+        self.client.get(reverse("profile_unfollow", args=[author.username]))
+        self.assertFalse(is_following(self.user.id, author.id))
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="feed_author")
+        cls.group = Group.objects.create(
+            title="Лента", slug="feed-group", description="feed"
+        )
+        cls.post = Post.objects.create(
+            text="first feed post", author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_feed_formats(self):
+        """Ленты отдаются в форматах Atom, RSS и JSON Feed"""
+        urls = [
+            reverse("index_feed", args=["atom"]),
+            reverse("group_feed", args=[self.group.slug, "atom"]),
+            reverse("author_feed", args=[self.author.username, "atom"]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response["Content-Type"],
+                    "application/atom+xml; charset=utf-8",
+                )
+                self.assertContains(response, "first feed post")
+        response = self.client.get(reverse("index_feed", args=["rss"]))
+        self.assertEqual(
+            response["Content-Type"], "application/rss+xml; charset=utf-8"
+        )
+        response = self.client.get(reverse("index_feed", args=["json"]))
+        self.assertEqual(
+            response.json()["items"][0]["content_text"], "first feed post"
+        )
+        response = self.client.get(reverse("index_feed", args=["xml"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get(self):
+        """Клиент с последней версией ленты получает 304"""
+        url = reverse("author_feed", args=[self.author.username, "json"])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text="second feed post", author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_post_extends_document(self):
+        """Новая запись добавляется в ленту, правка пересобирает её"""
+        url = reverse("group_feed", args=[self.group.slug, "json"])
+        self.client.get(url)
+        post = Post.objects.create(
+            text="second feed post", author=self.author, group=self.group
+        )
+        items = self.client.get(url).json()["items"]
+        self.assertEqual(
+            [item["content_text"] for item in items],
+            ["second feed post", "first feed post"],
+        )
+        post.text = "edited feed post"
+        post.save()
+        items = self.client.get(url).json()["items"]
+        self.assertEqual(items[0]["content_text"], "edited feed post")
+        post.group = None
+        post.save()
+        items = self.client.get(url).json()["items"]
+        self.assertEqual(len(items), 1)
+
+
+class SitemapTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="map_author")
+        cls.posts = [
+            Post.objects.create(text=f"map {i}", author=cls.author)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, **kwargs):
+        return write_sitemaps(
+            root=self.root,
+            base_url="https://example.com",
+            chunk_size=2,
+            **kwargs,
+        )
+
+    def read(self, name):
+        with open(f"{self.root}/{name}", encoding="utf-8") as file:
+            return file.read()
+
+    def test_sitemaps_are_chunked(self):
+        """Записи разбиваются на карты сайта не больше заданного размера"""
+        manifest = self.write()
+        posts = manifest["sections"]["posts"]
+        self.assertEqual([chunk["count"] for chunk in posts], [2, 1])
+        url = reverse("post", args=["map_author", self.posts[2].id])
+        self.assertIn(f"https://example.com{url}", self.read("posts-2.xml"))
+        index = self.read("sitemap.xml")
+        self.assertIn(
+            f"https://example.com{settings.SITEMAP_URL}posts-1.xml", index
+        )
+        self.assertIn("profiles-1.xml", index)
+
+    def test_only_newest_chunk_is_rewritten(self):
+        """Новые записи дописываются только в последнюю карту"""
+        self.write()
+        Post.objects.filter(pk=self.posts[0].pk).update(hidden=True)
+        post = Post.objects.create(text="map new", author=self.author)
+        posts = self.write()["sections"]["posts"]
+        self.assertEqual([chunk["count"] for chunk in posts], [2, 2])
+        self.assertIn(
+            reverse("post", args=["map_author", post.id]),
+            self.read("posts-2.xml"),
+        )
+        self.assertIn(
+            reverse("post", args=["map_author", self.posts[0].id]),
+            self.read("posts-1.xml"),
+        )
+        posts = self.write(full=True)["sections"]["posts"]
+        self.assertEqual([chunk["count"] for chunk in posts], [2, 1])
+
+    def test_archived_posts_are_listed(self):
+        """Архивные записи попадают в свой раздел карты сайта"""
+        self.assertEqual(self.write()["sections"]["archived"], [])
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            pub_date=timezone.now() - timedelta(days=400)
+        )
+        archive_posts(before=timezone.now() - timedelta(days=365))
+        manifest = self.write(full=True)
+        self.assertEqual(
+            [chunk["count"] for chunk in manifest["sections"]["archived"]],
+            [1],
+        )
+        url = reverse("post", args=["map_author", self.posts[0].id])
+        self.assertIn(url, self.read("archived-1.xml"))
+        self.assertNotIn(url, self.read("posts-1.xml"))
+
+
+class IndexLayoutTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="layout_author")
+        cls.group = Group.objects.create(title="layout", slug="layout")
+        for i in range(7):
+            Post.objects.create(
+                text=f"layout {i}",
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_columns_are_prepared_once(self):
+        """Колонки главной собираются из подготовленных записей"""
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("index"))
+        columns = response.context["columns"]
+        self.assertEqual([len(column) for column in columns], [3, 3, 1])
+        posts = [post for column in columns for post in column]
+        self.assertIsInstance(posts[0], PreparedPost)
+        self.assertEqual(
+            [post.id for post in posts],
+            [post.id for post in response.context["page"].object_list],
+        )
+        self.assertContains(response, "#layout", count=3)
+
+
+@override_settings(
+    PAGE_SIZES={**settings.PAGE_SIZES, "index": 4, "profile": 4}
+)
+class ScrollTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="scroll_author")
+        cls.posts = [
+            Post.objects.create(text=f"scroll {i}", author=cls.author)
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def scroll(self, url):
+        """Тексты всех записей ленты, дочитанной до конца"""
+        texts = []
+        while url:
+            response = self.client.get(url)
+            self.assertNotContains(response, "<html")
+            texts.extend(
+                post.text
+                for column in response.context.get("columns") or [
+                    response.context["posts"]
+                ]
+                for post in column
+            )
+            url = response.context["scroll_url"]
+        return texts
+
+    def test_index_scrolls_to_the_end(self):
+        """Лента главной дочитывается порциями после первой страницы"""
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "scroll-next")
+        texts = self.scroll(response.context["scroll_url"])
+        self.assertEqual(texts, [f"scroll {i}" for i in range(5, -1, -1)])
+
+    def test_profile_scrolls_to_the_end(self):
+        """Профиль дочитывается порциями, включая архив"""
+        Post.objects.filter(pk=self.posts[0].pk).update(hidden=True)
+        archive_posts(before=self.posts[3].pub_date)
+        url = reverse("profile_scroll", args=[self.author.username])
+        texts = self.scroll(url)
+        self.assertEqual(texts, [f"scroll {i}" for i in range(9, 0, -1)])
+
+    def test_bad_cursor(self):
+        """Неверный курсор даёт 404"""
+        response = self.client.get(reverse("index_scroll") + "?after=x_y")
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,123 @@
+"""Post image uploads.
+
+Uploads are streamed to a temporary file and hashed on the way, then
+stored under the hash of their content: the same image uploaded twice
+is kept once. Size and pixel limits are checked on the file header
+before the image is decoded, and metadata is dropped on save.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.deconstruct import deconstructible
+from PIL import Image, ImageOps
+
+STRIPPED_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Writes uploads to disk and hashes them chunk by chunk; the bytes
+    over POST_IMAGE_MAX_SIZE are counted but not written"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_SIZE:
+            return None
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+def file_sha256(content):
+    sha256 = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+def validate_image_limits(value):
+    """Checks the size of the file and the dimensions from its header"""
+    if getattr(value, "_committed", False):
+        return
+    if value.size > settings.POST_IMAGE_MAX_SIZE:
+        raise ValidationError(
+            "Файл больше %(limit)s МБ",
+            params={"limit": settings.POST_IMAGE_MAX_SIZE // 2 ** 20},
+        )
+    file = getattr(value, "file", value)
+    position = file.tell()
+    try:
+        width, height = Image.open(file).size
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError("Загрузите правильное изображение")
+    finally:
+        file.seek(position)
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Изображение больше %(limit)s мегапикселей",
+            params={"limit": settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+
+
+def strip_metadata(content):
+    """Re-saves JPEG, PNG and WebP images without EXIF and text chunks.
+
+    Returns a spooled temporary file, or ``content`` for other formats.
+    """
+    content.seek(0)
+    image = Image.open(content)
+    if image.format not in STRIPPED_FORMATS:
+        content.seek(0)
+        return content
+    image_format = image.format
+    options = {}
+    icc_profile = image.info.get("icc_profile")
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    orientation = image.getexif().get(0x0112, 1)
+    if orientation != 1:
+        image = ImageOps.exif_transpose(image)
+        if image_format == "JPEG":
+            options["quality"] = 90
+    elif image_format == "JPEG":
+        options["quality"] = "keep"
+    stripped = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(stripped, format=image_format, **options)
+    stripped.seek(0)
+    return File(stripped)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Names files ``<upload_to>/<ab>/<sha256>.<ext>``"""
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = getattr(content, "sha256", None) or file_sha256(content)
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest + extension,
+        )
+        if self.exists(name):
+            return name
+        return super().save(name, strip_metadata(content), max_length)
@@ -4,13 +4,24 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('scroll/', views.index_scroll, name='index_scroll'),
     path('new/', views.new_post, name='new'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/scroll/', views.follow_scroll, name='follow_scroll'),
+    path('popular/', views.popular, name='popular'),
+    path('popular/scroll/', views.popular_scroll, name='popular_scroll'),
+    path('feed/<str:format>/', views.index_feed, name='index_feed'),
     path('<str:username>/follow/', views.profile_follow, name='profile_follow'),
     path('<str:username>/unfollow/', views.profile_unfollow, name='profile_unfollow'),
+    path('group/', views.group_index, name='group_index'),
     path('group/<slug:slug>/', views.group_posts, name='group'),
+    path('group/<slug:slug>/scroll/', views.group_scroll, name='group_scroll'),
+    path('group/<slug:slug>/feed/<str:format>/', views.group_feed, name='group_feed'),
     path('<str:username>/', views.profile, name='profile'),
+    path('<str:username>/scroll/', views.profile_scroll, name='profile_scroll'),
+    path('<str:username>/feed/<str:format>/', views.author_feed, name='author_feed'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path('<str:username>/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path('<str:username>/<int:post_id>/image/', views.post_image, name='post_image'),
     path('<str:username>/<int:post_id>/comment/', views.add_comment, name='comment'),
 ]
@@ -1,65 +1,190 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 
+from yatube.ratelimit import ratelimit
+
+from . import writes
+from .archive import ArchiveChain
+from .feeds import Scope, feed_response
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .holes import author_scopes, group_scopes, index_scopes, shared_page
+from .loaders import get_loaders
+from .media import media_response
+from .models import ArchivedPost, Group, Post
+from .prepared import prepare_posts, split_columns
+from .scroll import next_posts, page_scroll_url, scroll_url
+from .signals import remember_group
+from .stats import get_top_authors
+
+COMMENTS_PER_PAGE = 50
+POST_IMAGE_MAX_AGE = 60 * 60 * 24
+INDEX_COLUMNS = 3
+
+
+def get_user_or_404(request, username):
+    author = get_loaders(request).users_by_username.get(username)
+    if author is None:
+        raise Http404('Пользователь не найден')
+    return author
+
 
+def get_group_or_404(request, slug):
+    group = get_loaders(request).groups_by_slug.get(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    return group
 
-# @cache_page(20)
+
+def get_page(request, object_list, per_page, count=None):
+    """Returns the requested page; a known count saves the COUNT query"""
+    paginator = Paginator(object_list, per_page)
+    if count is not None:
+        paginator.count = count
+    return paginator.get_page(request.GET.get('page'))
+
+
+@shared_page(index_scopes)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 30)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    page = [page[:10], page[10:20], page[20:]]
+    post_list = Post.objects.visible()
+    page = get_page(request, post_list, settings.PAGE_SIZES['index'])
+    page.object_list = list(page.object_list)
+    posts = prepare_posts(request, page.object_list)
     return render(
         request,
         'index.html',
+        {'page': page,
+         'columns': split_columns(posts, INDEX_COLUMNS),
+         'scroll_url': page_scroll_url(page, reverse('index_scroll')), }
+    )
+
+
+@shared_page(index_scopes)
+def index_scroll(request):
+    posts, cursor = next_posts(
+        [Post.objects.visible()], 'pub_date',
+        request.GET.get('after'), settings.PAGE_SIZES['index'],
+    )
+    return render_scroll(
+        request, cursor,
+        columns=split_columns(prepare_posts(request, posts), INDEX_COLUMNS),
+    )
+
+
+def render_scroll(request, cursor, **context):
+    """The cards of a fragment and the marker of the next one"""
+    context.update(scroll_url=scroll_url(request.path, cursor))
+    return render(request, 'include/scroll.html', context)
+
+
+def popular_posts():
+    return Post.objects.visible().popular().select_related(
+        'author', 'group', 'rank'
+    )
+
+
+def popular(request):
+    """Shows the posts ranked by the rank_posts command"""
+    page = get_page(request, popular_posts(), settings.PAGE_SIZES['popular'])
+    return render(
+        request,
+        'popular.html',
+        {'page': page,
+         'popular': True,
+         'scroll_url': page_scroll_url(
+             page, reverse('popular_scroll'), 'rank__score'
+         ), }
+    )
+
+
+def popular_scroll(request):
+    posts, cursor = next_posts(
+        [popular_posts()], 'rank__score',
+        request.GET.get('after'), settings.PAGE_SIZES['popular'],
+    )
+    return render_scroll(request, cursor, posts=posts)
+
+
+def group_index(request):
+    """Lists the groups, the most recently active first"""
+    group_list = Group.objects.by_activity()
+    page = get_page(request, group_list, settings.PAGE_SIZES['groups'])
+    return render(
+        request,
+        'groups.html',
         {'page': page, }
     )
 
 
+@shared_page(group_scopes)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    loaders = get_loaders(request)
+    group = get_group_or_404(request, slug)
+    post_list = group.posts.visible()
+    page = get_page(
+        request, post_list, settings.PAGE_SIZES['group'],
+        count=group.post_count,
+    )
+    loaders.attach(page, 'author', 'group')
     return render(
         request,
         'group.html',
         {'group': group,
-         'page': page, }
+         'top_authors': get_top_authors(group),
+         'page': page,
+         'scroll_url': page_scroll_url(
+             page, reverse('group_scroll', args=[slug])
+         ), }
+    )
+
+
+@shared_page(group_scopes)
+def group_scroll(request, slug):
+    loaders = get_loaders(request)
+    group = get_group_or_404(request, slug)
+    posts, cursor = next_posts(
+        [group.posts.visible()], 'pub_date',
+        request.GET.get('after'), settings.PAGE_SIZES['group'],
     )
+    loaders.attach(posts, 'author', 'group')
+    return render_scroll(request, cursor, posts=posts)
 
 
-def get_author_card_data(author, request):
-    post_count = author.posts.count()
-    following = Follow.objects.filter(
-        user_id=request.user.id,
-        author_id=author.id
+def get_author_card_data(author):
+    post_count = (
+        author.posts.visible().count()
+        + author.archived_posts.visible().count()
     )
     following_number = author.following.all().count()
     follower_number = author.follower.all().count()
     return {
         'post_count': post_count,
         'profile': author,
-        'following': following,
         'following_number': following_number,
         'follower_number': follower_number,
     }
 
 
+@shared_page(author_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = get_author_card_data(author, request)
-    context.update(page=page)
+    author = get_user_or_404(request, username)
+    post_list = ArchiveChain(
+        author.posts.visible().select_related('group'),
+        author.archived_posts.visible().select_related('group'),
+    )
+    page = get_page(request, post_list, settings.PAGE_SIZES['profile'])
+    get_loaders(request).attach(page, 'author')
+    context = get_author_card_data(author)
+    context.update(
+        page=page,
+        scroll_url=page_scroll_url(
+            page, reverse('profile_scroll', args=[username])
+        ),
+    )
     return render(
         request,
         'profile.html',
@@ -67,20 +192,48 @@ def profile(request, username):
     )
 
 
-def post_view(request, username, post_id):
-    post = get_object_or_404(
-        Post.objects.select_related('author'),
-        id=post_id,
-        author__username=username
+@shared_page(author_scopes)
+def profile_scroll(request, username):
+    author = get_user_or_404(request, username)
+    posts, cursor = next_posts(
+        [
+            author.posts.visible().select_related('group'),
+            author.archived_posts.visible().select_related('group'),
+        ],
+        'pub_date', request.GET.get('after'), settings.PAGE_SIZES['profile'],
     )
+    get_loaders(request).attach(posts, 'author')
+    return render_scroll(request, cursor, posts=posts)
+
+
+def get_post_or_archived(username, post_id, **filters):
+    """Looks the post up in the recent posts, then in the archive"""
+    for model in (Post, ArchivedPost):
+        post = model.objects.visible().select_related('author').filter(
+            id=post_id,
+            author__username=username,
+            **filters,
+        ).first()
+        if post is not None:
+            return post
+    raise Http404('Пост не найден')
+
+
+@shared_page(author_scopes)
+def post_view(request, username, post_id):
+    post = get_post_or_archived(username, post_id)
     author = post.author
-    form = CommentForm()
-    comments = post.comments.all()
-    context = get_author_card_data(author, request)
+    get_loaders(request).users.prime(author)
+    root_paths = post.comments.visible().filter(
+        parent__isnull=True
+    ).order_by('path').values_list('path', flat=True)
+    comments_page = get_page(request, root_paths, COMMENTS_PER_PAGE)
+    comments = post.comments.in_threads(list(comments_page))
+    context = get_author_card_data(author)
     context.update(
         post=post,
-        form=form,
         comments=comments,
+        comments_page=comments_page,
     )
     return render(
         request,
@@ -90,54 +243,68 @@ def post_view(request, username, post_id):
 
 
 @login_required
+@ratelimit('comment')
 def add_comment(request, username, post_id):
     form = CommentForm(request.POST)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.post_id = post_id
-        comment.author_id = request.user.id
-        comment.save()
+        comment = writes.add_comment(
+            post_id,
+            request.user.id,
+            form.cleaned_data['text'],
+            parent_id=form.cleaned_data['parent'],
+            username=username,
+        )
+        if comment is None:
+            raise Http404('Пост не найден')
     return redirect('post', username, post_id)
 
 
+def followed_posts(user):
+    return Post.objects.visible().filter(author__following__user=user.id)
+
+
 @login_required
 def follow_index(request):
     """Отображает персональную ленту пользователя"""
-    post_list = Post.objects.filter(author__following__user=request.user.id)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = get_page(
+        request, followed_posts(request.user), settings.PAGE_SIZES['follow']
+    )
+    get_loaders(request).attach(page, 'author', 'group')
     return render(request, 'follow.html',
-                  {'page': page}
+                  {'page': page,
+                   'scroll_url': page_scroll_url(
+                       page, reverse('follow_scroll')
+                   )}
                   )
 
 
 @login_required
+def follow_scroll(request):
+    posts, cursor = next_posts(
+        [followed_posts(request.user)], 'pub_date',
+        request.GET.get('after'), settings.PAGE_SIZES['follow'],
+    )
+    get_loaders(request).attach(posts, 'author', 'group')
+    return render_scroll(request, cursor, posts=posts)
+
+
+@login_required
+@ratelimit('follow')
 def profile_follow(request, username):
     """Осуществляет подписку"""
-    author = get_object_or_404(User, username=username)
-    following = Follow.objects.filter(
-        user_id=request.user.id,
-        author_id=author.id
-    ).exists()
-    if request.user != author and not following:
-        Follow.objects.create(
-            user_id=request.user.id,
-            author_id=author.id
-        )
+    writes.follow(request.user.id, username)
     return redirect('profile', username)
 
 
 @login_required
+@ratelimit('follow')
 def profile_unfollow(request, username):
-    Follow.objects.get(
-        user_id=request.user.id,
-        author_id=get_object_or_404(User, username=username).id
-    ).delete()
+    writes.unfollow(request.user.id, username)
     return redirect('profile', username)
 
 
 @login_required
+@ratelimit('post', methods=('POST',))
 def new_post(request):
     """Returns the form to create a post or creates a post"""
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -158,11 +325,15 @@ def new_post(request):
 
 
 @login_required
+@ratelimit('post', methods=('POST',))
 def post_edit(request, username, post_id):
     """Allows you to change the post"""
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.visible(), id=post_id, author__username=username
+    )
     if request.user.id != post.author_id:
         return redirect('post', username, post_id)
+    remember_group(post)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -184,6 +355,32 @@ def post_edit(request, username, post_id):
     )
 
 
+def post_image(request, username, post_id):
+    """Gives out the original image of an existing post.
+
+    Images are stored by content and outlive deleted posts,
+    so nginx only serves them after this check.
+    """
+    image = get_post_or_archived(username, post_id, image__gt='').image
+    response = media_response(image.name)
+    patch_cache_control(response, public=True, max_age=POST_IMAGE_MAX_AGE)
+    return response
+
+
+def index_feed(request, format):
+    return feed_response(request, Scope.index(), format)
+
+
+def group_feed(request, slug, format):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, Scope.group(group), format)
+
+
+def author_feed(request, username, format):
+    author = get_user_or_404(request, username)
+    return feed_response(request, Scope.author(author), format)
+
+
 def page_not_found(request, exception):
     return render(
         request,
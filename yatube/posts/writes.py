@@ -0,0 +1,158 @@
+"""Writes of the views and the API in as few statements as possible.
+
+Each write is one statement that checks its own conditions, instead of
+a lookup followed by a write: a follow is an ``INSERT ... SELECT ...
+ON CONFLICT DO NOTHING`` resting on the unique constraint of Follow,
+an unfollow a ``DELETE ... RETURNING`` and a comment an ``INSERT ...
+SELECT`` that only finds the post when it is visible and written by the
+author of the URL and writes the path with the id it reserves. There
+is no window between the check and the write and no exception to catch
+when two requests race.
+
+The statements bypass the model signals, so the counters, the
+follow suggestions and the caches that depend on the write are updated
+here, in the same transaction. The caches are dropped again once it
+commits, in case a request cached the old state in between.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .follows import forget_follow_set
+from .holes import bump_page_versions, post_page_scopes
+from .models import Comment, Follow, Post, User
+from .suggestions import mark_stale
+
+# the id the next row of a table gets, and an id zero-padded to a width
+NEXT_ID_SQL = {
+    "postgresql": "nextval(pg_get_serial_sequence('{table}', 'id'))",
+    "sqlite": (
+        "(SELECT COALESCE(MAX(seq), 0) + 1 FROM sqlite_sequence "
+        "WHERE name = '{table}')"
+    ),
+}
+PADDED_ID_SQL = {
+    "postgresql": "LPAD({id}::text, {width}, '0')",
+    "sqlite": "PRINTF('%%0{width}d', {id})",
+}
+
+
+def _forget_follow_sets(*user_ids):
+    for user_id in user_ids:
+        forget_follow_set(user_id)
+
+
+def drop_follow_caches(user_id, author_id):
+    _forget_follow_sets(user_id)
+    transaction.on_commit(lambda: _forget_follow_sets(user_id))
+    bump_page_versions([f"author:{author_id}", f"author:{user_id}"])
+
+
+def follow(user_id, username):
+    """Follows the author ``username``; returns the follow, or None if
+    there is no such author, it is the user or the follow exists"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {Follow._meta.db_table} (user_id, author_id) "
+                f"SELECT %s, id FROM {User._meta.db_table} "
+                f"WHERE username = %s AND id <> %s "
+                f"ON CONFLICT DO NOTHING RETURNING id, author_id",
+                [user_id, username, user_id],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        mark_stale(user_id, row[1])
+        drop_follow_caches(user_id, row[1])
+    return Follow(id=row[0], user_id=user_id, author_id=row[1])
+
+
+def unfollow(user_id, username):
+    """Deletes the follow of the author ``username``; returns the
+    author id, or None if there was no such follow"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Follow._meta.db_table} "
+                f"WHERE user_id = %s AND author_id IN "
+                f"(SELECT id FROM {User._meta.db_table} WHERE username = %s) "
+                f"RETURNING author_id",
+                [user_id, username],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        mark_stale(user_id, row[0])
+        drop_follow_caches(user_id, row[0])
+    return row[0]
+
+
+def add_comment(post_id, author_id, text, parent_id=None, username=None):
+    """Comments the visible post ``post_id``, written by ``username``
+    when given; returns the comment, or None if there is no such post.
+
+    A parent from another post is ignored and replies deeper than
+    Comment.MAX_DEPTH go to the parent of the parent, as Comment.save
+    does. The id is reserved in the INSERT itself, so the path is
+    written whole; the comment count is then raised by an UPDATE that
+    returns the ids the caches of the post need.
+    """
+    post_table = Post._meta.db_table
+    comment_table = Comment._meta.db_table
+    step = Comment.PATH_STEP + 1
+    too_deep = (Comment.MAX_DEPTH + 1) * step
+    next_id = NEXT_ID_SQL[connection.vendor].format(table=comment_table)
+    padded_id = PADDED_ID_SQL[connection.vendor].format(
+        id="next_comment.id", width=Comment.PATH_STEP
+    )
+    created = timezone.now()
+    params = [author_id, text, created, False, parent_id, post_id, False]
+    author_filter = ""
+    if username is not None:
+        author_filter = (
+            f"AND post.author_id = "
+            f"(SELECT id FROM {User._meta.db_table} WHERE username = %s) "
+        )
+        params.append(username)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {comment_table} (id, post_id, author_id, "
+                f"text, created, hidden, parent_id, path) "
+                f"SELECT next_comment.id, post.id, %s, %s, %s, %s, "
+                f"CASE WHEN LENGTH(parent.path) >= {too_deep} "
+                f"THEN parent.parent_id ELSE parent.id END, "
+                f"CASE WHEN LENGTH(parent.path) >= {too_deep} "
+                f"THEN SUBSTR(parent.path, 1, LENGTH(parent.path) - {step}) "
+                f"ELSE COALESCE(parent.path, '') END || {padded_id} || '/' "
+                f"FROM (SELECT {next_id} AS id) next_comment, "
+                f"{post_table} post "
+                f"LEFT JOIN {comment_table} parent "
+                f"ON parent.id = %s AND parent.post_id = post.id "
+                f"WHERE post.id = %s AND post.hidden = %s "
+                f"AND post.deleted IS NULL {author_filter}"
+                f"RETURNING id, parent_id, path",
+                params,
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute(
+                f"UPDATE {post_table} "
+                f"SET comment_count = comment_count + 1 WHERE id = %s "
+                f"RETURNING author_id, group_id",
+                [post_id],
+            )
+            post_author_id, group_id = cursor.fetchone()
+        bump_page_versions(post_page_scopes(
+            Post(id=post_id, author_id=post_author_id, group_id=group_id)
+        ))
+    return Comment(
+        id=row[0],
+        post_id=post_id,
+        author_id=author_id,
+        parent_id=row[1],
+        path=row[2],
+        text=text,
+        created=created,
+    )
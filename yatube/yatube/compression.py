@@ -0,0 +1,174 @@
+"""Response compression with the best encoding the client accepts.
+
+zstd and brotli are used when the zstandard and brotli packages are
+installed, gzip always works. Small responses, responses that are
+compressed already and media types that do not shrink are sent as is;
+streaming responses are compressed chunk by chunk, so exports never
+have to fit in memory.
+"""
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/atom+xml",
+    "application/rss+xml",
+    "application/feed+json",
+    "application/x-yaml",
+    "application/yaml",
+    "image/svg+xml",
+)
+re_accepts = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?")
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def available_encodings():
+    """Supported encodings, the preferred one first"""
+    encodings = {}
+    if zstandard is not None:
+        encodings["zstd"] = ZstdCompressor
+    if brotli is not None:
+        encodings["br"] = BrotliCompressor
+    encodings["gzip"] = GzipCompressor
+    return encodings
+
+
+ENCODINGS = available_encodings()
+
+
+def choose_encoding(accept_encoding):
+    """The preferred of our encodings with the highest q value in the
+    Accept-Encoding header, or None"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        match = re_accepts.match(part)
+        if match is None:
+            continue
+        name, quality = match.groups()
+        try:
+            accepted[name.lower()] = float(quality or 1)
+        except ValueError:
+            continue
+    best, best_quality = None, 0
+    for name in ENCODINGS:
+        quality = accepted.get(name, accepted.get("*", 0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(encoding, data, level=None):
+    compressor = ENCODINGS[encoding](
+        settings.COMPRESSION_LEVELS[encoding] if level is None else level
+    )
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_sequence(encoding, sequence):
+    compressor = ENCODINGS[encoding](settings.COMPRESSION_LEVELS[encoding])
+    for data in sequence:
+        chunk = compressor.compress(data) + compressor.flush()
+        if chunk:
+            yield chunk
+    yield compressor.finish()
+
+
+def is_compressible(response):
+    content_type = response.get("Content-Type", "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """GZipMiddleware with zstd and brotli, a size threshold and a list
+    of compressible media types"""
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not is_compressible(response):
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                encoding, response.streaming_content
+            )
+            del response["Content-Length"]
+        else:
+            compressed = compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,96 @@
+"""Token bucket rate limiting shared by the workers through the cache.
+
+A bucket holds ``N`` tokens and gets ``N`` new ones per period for a
+rate of ``"N/period"``. It is stored as a single integer, the
+theoretical arrival time (TAT) in milliseconds of the generic cell rate
+algorithm: every request moves it one interval forward with an atomic
+``incr``, and the request is allowed while it stays within one burst
+of the current time. A request therefore costs one cache round trip;
+only the first request of an idle client and the refused ones need
+a second.
+
+Buckets are kept per endpoint class (the scopes of RATELIMITS) and per
+client: the user for logged in requests, the IP address otherwise.
+"""
+import time
+from functools import wraps
+from math import ceil
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+KEY_TIMEOUT = 60 * 60
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """``"10/min"`` -> ``(10, 60)``, like DRF throttle rates"""
+    number, period = rate.split("/")
+    return int(number), PERIODS[period[0]]
+
+
+class TokenBucket:
+    def __init__(self, scope, rate=None):
+        self.scope = scope
+        capacity, period = parse_rate(rate or settings.RATELIMITS[scope])
+        self.interval = max(period * 1000 // capacity, 1)
+        self.burst = capacity * self.interval
+        self.cache = caches[settings.RATELIMIT_CACHE]
+
+    def consume(self, ident, now=None):
+        """Takes a token; returns 0 if there was one, or the number of
+        seconds until the next token otherwise"""
+        key = f"ratelimit:{self.scope}:{ident}"
+        now = int((time.time() if now is None else now) * 1000)
+        try:
+            tat = self.cache.incr(key, self.interval)
+        except ValueError:
+            self.cache.add(key, now, KEY_TIMEOUT)
+            tat = self.cache.incr(key, self.interval)
+        if tat - self.interval < now:
+            # the bucket was full, start counting from now
+            tat = now + self.interval
+            self.cache.set(key, tat, KEY_TIMEOUT)
+        if tat <= now + self.burst:
+            return 0
+        self.cache.decr(key, self.interval)
+        return (tat - self.burst - now) / 1000
+
+
+def client_ident(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    address = (
+        request.META.get(settings.RATELIMIT_IP_HEADER)
+        or request.META.get("REMOTE_ADDR")
+    )
+    return f"ip:{address}"
+
+
+def too_many_requests(wait):
+    response = HttpResponse(
+        "Слишком много запросов, попробуйте позже",
+        content_type="text/plain; charset=utf-8",
+        status=429,
+    )
+    response["Retry-After"] = str(ceil(wait))
+    return response
+
+
+def ratelimit(scope, methods=None):
+    """Limits a function view with the bucket of ``scope``; with
+    ``methods`` only the requests of those methods take tokens"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLED and (
+                methods is None or request.method in methods
+            ):
+                wait = TokenBucket(scope).consume(client_ident(request))
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
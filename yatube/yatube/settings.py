@@ -1,12 +1,13 @@
 import os
 from datetime import timedelta
+from importlib.util import find_spec
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = 'n-fwr-t995z-_xrv-(zn%$%bv(l0fsld))$vb%plfhsah%+pbu'
 
-DEBUG = os.environ.get('DEBUG', False)
+DEBUG = os.environ.get('DEBUG', '').lower() in ('1', 'true', 'yes')
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -31,7 +32,6 @@ INSTALLED_APPS = [
     'rest_framework',
     'djoser',
     'sorl.thumbnail',
-    'debug_toolbar',
     'drf_yasg',
     'about.apps.AboutConfig',
     'users.apps.UsersConfig',
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,9 +48,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# The toolbar is only loaded for development, set DEBUG_TOOLBAR
+# to keep it off in a DEBUG environment
+
+DEBUG_TOOLBAR = DEBUG and os.environ.get('DEBUG_TOOLBAR', '1') == '1'
+
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
@@ -58,7 +67,7 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
+        'APP_DIRS': DEBUG,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -70,6 +79,22 @@ TEMPLATES = [
     },
 ]
 
+# Templates are parsed once per process unless DEBUG is on,
+# WARMUP compiles all of them and loads the URLconf when the wsgi
+# application loads, before gunicorn --preload forks the workers
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+WARMUP = not DEBUG
+
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
@@ -123,6 +148,84 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Static files get content hashes in their names and are cached forever
+# by nginx, media that needs a check is sent by nginx via X-Accel-Redirect
+
+if not DEBUG:
+    STATICFILES_STORAGE = 'yatube.storage.HashedStaticFilesStorage'
+
+MEDIA_ACCEL_REDIRECT = not DEBUG
+MEDIA_ACCEL_REDIRECT_URL = '/protected-media/'
+
+# Uploads always go to a temporary file, never to memory, see posts.uploads
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.HashingFileUploadHandler',
+]
+
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# Responses are compressed with zstd, brotli or gzip, whichever the
+# client accepts and is installed, see yatube.compression
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVELS = {
+    'zstd': 3,
+    'br': 4,
+    'gzip': 6,
+}
+
+# Posts per page of each list, and per fragment of its infinite
+# scroll, see posts.scroll
+
+PAGE_SIZES = {
+    'index': 30,
+    'group': 10,
+    'profile': 10,
+    'follow': 10,
+    'popular': 10,
+    'groups': 30,
+}
+
+# Index, group, profile and post pages are rendered once for all users
+# with holes for the user specific parts, see posts.holes; anonymous
+# pages are public for SHARED_PAGE_TIMEOUT seconds and cached by nginx
+
+SHARED_PAGES = True
+SHARED_PAGE_CACHE = 'default'
+SHARED_PAGE_TIMEOUT = 20
+
+# Atom, RSS and JSON feeds of the site, groups and authors, see
+# posts.feeds; documents are extended as posts arrive
+
+FEED_CACHE = 'default'
+FEED_ITEMS = 20
+FEED_DOCUMENT_TIMEOUT = 60 * 60
+FEED_MAX_AGE = 60
+
+# Sitemaps written by the write_sitemaps command, see posts.sitemaps;
+# nginx serves SITEMAP_ROOT at SITEMAP_URL and the index at /sitemap.xml
+
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+SITEMAP_URL = '/sitemaps/'
+SITEMAP_BASE_URL = os.environ.get('SITE_URL', 'https://www.sgamb.ru')
+SITEMAP_CHUNK_SIZE = 50000
+
+# Token buckets per client and endpoint class, see yatube.ratelimit;
+# the cache has to be shared by the workers for the limits to hold
+
+RATELIMIT_ENABLED = True
+RATELIMIT_CACHE = 'default'
+RATELIMIT_IP_HEADER = 'HTTP_X_REAL_IP'
+RATELIMITS = {
+    'post': '20/m',
+    'comment': '30/m',
+    'follow': '60/m',
+    'api_read': '600/m',
+    'api_write': '60/m',
+}
+
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = 'index'
 LOGOUT_REDIRECT_URL = 'index'
@@ -138,8 +241,32 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack and CBOR are offered when their packages are installed,
+# see api.renderers
+
+for package, format_name in (('msgpack', 'MessagePack'), ('cbor2', 'CBOR')):
+    if find_spec(package) is not None:
+        REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+            f'api.renderers.{format_name}Renderer'
+        )
+        REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+            f'api.renderers.{format_name}Parser'
+        )
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -152,7 +279,36 @@ SWAGGER_SETTINGS = {
             'name': 'Authorization',
             'in': 'header'
         }
-    }
+    },
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
 }
 
+# Posts older than ARCHIVE_AFTER_DAYS are moved to the archive tables
+# and deleted posts are removed for good after the retention period
+# by the archive_posts command
+
+ARCHIVE_AFTER_DAYS = 365
+SOFT_DELETE_RETENTION_DAYS = 30
+
+# Monthly partitions of posts and comments on Postgres, see
+# posts.partitioning; run create_partitions monthly when enabled
+
+POST_PARTITIONING = (
+    os.environ.get('POST_PARTITIONING', '').lower() in ('1', 'true', 'yes')
+)
+POST_PARTITION_MONTHS_AHEAD = 3
+
+# Follow suggestions
+
+FOLLOW_GRAPH_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# Followed authors of each user as a sorted int array, see posts.follows
+
+FOLLOW_SET_CACHE = 'default'
+FOLLOW_SET_TIMEOUT = 60 * 60 * 24
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -0,0 +1,54 @@
+import gc
+import os
+
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+
+
+def iter_template_names(engine):
+    """Yields the names of the templates in DIRS and the app directories"""
+    dirs = list(engine.dirs) + list(get_app_template_dirs('templates'))
+    for template_dir in dirs:
+        for root, _, files in os.walk(template_dir):
+            for name in sorted(files):
+                if name.endswith(TEMPLATE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, template_dir).replace(
+                        os.sep, '/'
+                    )
+
+
+def warm_up_templates():
+    """Compiles every template into the cached loader.
+
+    Returns the names of compiled templates and a dict of failures.
+    """
+    engine = engines['django'].engine
+    compiled = []
+    failed = {}
+    for name in dict.fromkeys(iter_template_names(engine)):
+        try:
+            engine.get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError) as error:
+            failed[name] = error
+        else:
+            compiled.append(name)
+    return compiled, failed
+
+
+def warm_up():
+    """Loads what every worker needs before gunicorn --preload forks.
+
+    The objects created so far are moved out of the garbage collector's
+    reach, so collections in the workers do not write to, and copy,
+    the memory pages shared with the master process.
+    """
+    get_resolver().reverse_dict
+    warm_up_templates()
+    connections.close_all()
+    gc.collect()
+    gc.freeze()